@@ -0,0 +1,221 @@
+"""
+Concurrency stress benchmark for ticket booking.
+
+Many processes, each with several threads, book tickets for a single event as
+fast as they can, like buyers on gunicorn workers when an event goes on sale.
+Reports the booking rate and checks that no tickets were oversold.
+
+Usage (from the repository root):
+    python benchmarks/booking_stress.py --processes 4 --threads 4 --bookings 20000
+    python benchmarks/booking_stress.py --database-url postgresql://localhost/concerts_bench
+"""
+from collections import Counter
+from random import randint
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def make_app(database_url):
+    from concerts import create_app
+
+    config = {"SQLALCHEMY_DATABASE_URI": database_url}
+    if database_url.startswith("sqlite"):
+        # Wait on the write lock rather than failing straight away
+        config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"timeout": 30}}
+    return create_app(config)
+
+
+def setup(app, database_url, tickets):
+    """
+    Creates the schema and seeds one user and one event, returning their ids.
+    """
+    from datetime import datetime
+    from flask_migrate import upgrade
+    from sqlalchemy import text
+    from concerts import db
+    from concerts.models import Event, User
+
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, "migrations"))
+        if database_url.startswith("sqlite"):
+            db.session.execute(text("PRAGMA journal_mode=WAL"))
+
+        user = User(
+            username="bench",
+            email="bench@example.com",
+            hash="-",
+            contact_number=0,
+            address="-",
+        )
+        event = Event(
+            title="Stress test",
+            artist="Bench",
+            genre="load",
+            status="upcoming",
+            timestamp=datetime(2030, 1, 1),
+            tickets=tickets,
+            price=10.0,
+            user=user,
+        )
+        db.session.add(event)
+        db.session.commit()
+        ids = (user.id, event.id)
+        db.engine.dispose()
+    return ids
+
+
+def worker(database_url, user_id, event_id, bookings, threads, ready, start, results):
+    """
+    Books tickets from several threads and reports the results and tickets booked.
+    """
+    from concerts.booking import book_tickets, BOOKED
+
+    app = make_app(database_url)
+
+    # Start booking at the same time as every other worker
+    ready.put(True)
+    start.wait()
+    counts = Counter()
+    booked_tickets = Counter()
+    lock = threading.Lock()
+
+    def run(count):
+        for _ in range(count):
+            tickets = randint(1, 4)
+            with app.app_context():
+                result = book_tickets(event_id, user_id, tickets)
+            with lock:
+                counts[result] += 1
+                if result == BOOKED:
+                    booked_tickets["tickets"] += tickets
+
+    runners = [
+        threading.Thread(target=run, args=(bookings // threads,))
+        for _ in range(threads)
+    ]
+    for runner in runners:
+        runner.start()
+    for runner in runners:
+        runner.join()
+
+    results.put((dict(counts), booked_tickets["tickets"]))
+
+
+def verify(app, event_id):
+    """
+    Returns the remaining tickets, and the tickets and count of stored bookings.
+    """
+    from sqlalchemy import func
+    from concerts import db
+    from concerts.models import Booking, Event
+
+    with app.app_context():
+        remaining = (
+            db.session.query(Event.tickets).filter(Event.id == event_id).scalar()
+        )
+        booked, count = (
+            db.session.query(
+                func.coalesce(func.sum(Booking.tickets), 0), func.count(Booking.id)
+            )
+            .filter(Booking.event_id == event_id)
+            .one()
+        )
+    return remaining, booked, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--database-url", help="Defaults to a temporary SQLite database"
+    )
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument(
+        "--bookings", type=int, default=20000, help="Booking attempts in total"
+    )
+    parser.add_argument("--tickets", type=int, default=10000, help="Tickets for sale")
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        directory = tempfile.mkdtemp(prefix="booking_stress_")
+        database_url = "sqlite:///" + os.path.join(directory, "bench.sqlite")
+
+    # The app can only be created once per process, workers create their own
+    app = make_app(database_url)
+    user_id, event_id = setup(app, database_url, args.tickets)
+
+    # Spawn rather than fork, so no process inherits another's database connections
+    context = multiprocessing.get_context("spawn")
+    ready = context.Queue()
+    start = context.Event()
+    results = context.Queue()
+    per_process = args.bookings // args.processes
+    processes = [
+        context.Process(
+            target=worker,
+            args=(
+                database_url,
+                user_id,
+                event_id,
+                per_process,
+                args.threads,
+                ready,
+                start,
+                results,
+            ),
+        )
+        for _ in range(args.processes)
+    ]
+
+    for process in processes:
+        process.start()
+    for _ in processes:
+        ready.get()
+
+    started = time.perf_counter()
+    start.set()
+    counts = Counter()
+    reported_tickets = 0
+    for _ in processes:
+        process_counts, process_tickets = results.get()
+        counts.update(process_counts)
+        reported_tickets += process_tickets
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    remaining, booked, count = verify(app, event_id)
+    attempts = sum(counts.values())
+
+    print(f"database:          {database_url}")
+    print(f"concurrency:       {args.processes} processes x {args.threads} threads")
+    print(
+        f"attempts:          {attempts} in {elapsed:.2f}s ({attempts / elapsed:.0f}/s)"
+    )
+    print(f"bookings made:     {count} ({count / elapsed:.0f}/s)")
+    for result, result_count in sorted(counts.items()):
+        print(f"  {result + ':':<19}{result_count}")
+    print(
+        f"tickets:           {args.tickets} for sale, {booked} booked, {remaining} remaining"
+    )
+
+    oversold = (
+        booked + remaining != args.tickets
+        or remaining < 0
+        or booked != reported_tickets
+    )
+    print("oversold:          " + ("YES" if oversold else "no"))
+    sys.exit(1 if oversold else 0)
+
+
+if __name__ == "__main__":
+    main()
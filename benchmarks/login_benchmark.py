@@ -0,0 +1,221 @@
+"""
+Benchmark of logins, and of the listing's latency while the login page is attacked.
+
+Seeds a database, then serves it with gunicorn with login throttling off and on.
+For each, it measures the throughput of real logins, then the latency of the
+event listing while attackers post wrong passwords, either all from one address
+or each from a different address, as a credential stuffing run would.
+
+Usage (from the repository root, with gunicorn installed):
+    python benchmarks/login_benchmark.py
+    python benchmarks/login_benchmark.py --worker-class gevent --attackers 16
+"""
+from collections import Counter
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import site_benchmark
+import worker_modes
+
+# App settings of each server, throttled uses the defaults
+CONFIGS = {
+    "unthrottled": {
+        "AUTH_IP_BURST": "0",
+        "AUTH_EMAIL_BURST": "0",
+        "PASSWORD_HASH_QUEUE": "10000",
+    },
+    "throttled": {},
+}
+
+ATTACKS = ["none", "one address", "many addresses"]
+
+
+def random_address(rng):
+    return "10.{}.{}.{}".format(*[rng.randint(0, 255) for _ in range(3)])
+
+
+def csrf_token(client, path):
+    status, content = client.request("GET", path)
+    match = re.search(rb'name="csrf_token" type="hidden" value="([^"]+)"', content)
+    return match.group(1).decode() if match else ""
+
+
+def run_logins(base_url, users, args):
+    """
+    Logs users in from several threads, each user from its own address, and
+    returns the throughput, latency and statuses.
+    """
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def run(offset):
+        rng = random.Random(offset)
+        for i in range(offset, args.logins, args.threads):
+            user_id, email = users[i % len(users)]
+            client = site_benchmark.HTTPClient(
+                base_url, {"X-Forwarded-For": random_address(rng)}
+            )
+            data = {
+                "email": email,
+                "password": site_benchmark.PASSWORD,
+                "csrf_token": csrf_token(client, "/account"),
+            }
+            started = time.perf_counter()
+            status, content = client.request("POST", "/account", data)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] += 1
+
+    threads = [
+        threading.Thread(target=run, args=(offset,)) for offset in range(args.threads)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return len(latencies) / elapsed, latencies, statuses
+
+
+def run_attack(base_url, users, attack, args):
+    """
+    Measures the listing's latency while attackers post wrong passwords, and
+    returns the listing latencies and the attackers' throughput and statuses.
+    """
+    stop = threading.Event()
+    latencies = []
+    attempts = Counter()
+    lock = threading.Lock()
+
+    def attacker(seed):
+        rng = random.Random(seed)
+        client = site_benchmark.HTTPClient(base_url, {"X-Forwarded-For": "10.0.0.1"})
+        token = csrf_token(client, "/account")
+        while not stop.is_set():
+            if attack == "many addresses":
+                client.headers["X-Forwarded-For"] = random_address(rng)
+            data = {
+                "email": rng.choice(users)[1],
+                "password": "wrong password",
+                "csrf_token": token,
+            }
+            status, content = client.request("POST", "/account", data)
+            with lock:
+                attempts[status] += 1
+
+    def reader():
+        client = site_benchmark.HTTPClient(base_url)
+        while not stop.is_set():
+            started = time.perf_counter()
+            client.request("GET", "/findevents/")
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=reader) for _ in range(args.readers)]
+    if attack != "none":
+        threads += [
+            threading.Thread(target=attacker, args=(seed,))
+            for seed in range(args.attackers)
+        ]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return latencies, sum(attempts.values()) / args.seconds, attempts
+
+
+def format_statuses(statuses):
+    return " ".join(f"{status}:{count}" for status, count in sorted(statuses.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--database-url", help="Defaults to a temporary SQLite database"
+    )
+    parser.add_argument("--worker-class", default="sync")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent logins")
+    parser.add_argument("--attackers", type=int, default=8)
+    parser.add_argument(
+        "--readers", type=int, default=2, help="Concurrent listing clients"
+    )
+    parser.add_argument(
+        "--seconds", type=float, default=10, help="Duration of each attack"
+    )
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        directory = tempfile.mkdtemp(prefix="login_benchmark_")
+        database_url = "sqlite:///" + os.path.join(directory, "bench.sqlite")
+
+    seed_args = site_benchmark.parse_args(["--distinct-images", "0"])
+    app = site_benchmark.make_app(database_url)
+    site_benchmark.seed(app, database_url, seed_args)
+    users, events, digests = site_benchmark.load_fixtures(app)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    print(f"database: {database_url}")
+    print(
+        f"workers:  {args.workers} {args.worker_class} workers, "
+        f"on {os.cpu_count()} cores"
+    )
+
+    for name, settings in CONFIGS.items():
+        # Client addresses are read from X-Forwarded-For, as behind Heroku's router
+        settings = dict({"TRUSTED_PROXIES": "1", "AUTH_IP_BURST": "20"}, **settings)
+        server = worker_modes.serve(
+            database_url, args.worker_class, args.workers, args.port, settings
+        )
+        try:
+            print()
+            print(name)
+            throughput, latencies, statuses = run_logins(base_url, users, args)
+            print(
+                f"  logins: {throughput:.1f}/s, "
+                f"p50 {site_benchmark.percentile(latencies, 0.5) * 1000:.0f} ms, "
+                f"p95 {site_benchmark.percentile(latencies, 0.95) * 1000:.0f} ms, "
+                f"statuses {format_statuses(statuses)}"
+            )
+
+            for attack in ATTACKS:
+                latencies, rate, attempts = run_attack(base_url, users, attack, args)
+                line = (
+                    f"  listing with attack from {attack}: "
+                    f"p50 {site_benchmark.percentile(latencies, 0.5) * 1000:.1f} ms, "
+                    f"p95 {site_benchmark.percentile(latencies, 0.95) * 1000:.1f} ms, "
+                    f"{len(latencies) / args.seconds:.0f}/s"
+                )
+                if attempts:
+                    line += (
+                        f"; attempts {rate:.0f}/s, "
+                        f"statuses {format_statuses(attempts)}"
+                    )
+                print(line)
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
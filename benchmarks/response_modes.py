@@ -0,0 +1,119 @@
+"""
+Benchmark of compressed and streamed responses of the listing pages.
+
+Seeds a database, then serves it with gunicorn with the listing pages rendered
+whole or streamed, and sent uncompressed or compressed, and reports each page's
+throughput, latency, time to first byte and bytes on the wire.
+
+Usage (from the repository root, with gunicorn installed):
+    python benchmarks/response_modes.py
+    python benchmarks/response_modes.py --events 5000 --threads 8
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import site_benchmark
+import worker_modes
+
+# App settings of each server, streamed and compressed uses the defaults
+MODES = {
+    "rendered": {"STREAM_TEMPLATES": "0", "COMPRESS_RESPONSES": "0"},
+    "rendered, compressed": {"STREAM_TEMPLATES": "0"},
+    "streamed": {"COMPRESS_RESPONSES": "0"},
+    "streamed, compressed": {},
+}
+
+SCENARIOS = ["listing_user", "bookedevents", "myevents"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--database-url", help="Defaults to a temporary SQLite database"
+    )
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=4, help="Concurrent clients")
+    parser.add_argument(
+        "--requests", type=int, default=200, help="Timed requests per scenario"
+    )
+    parser.add_argument(
+        "--events", type=int, default=2000, help="More events make longer myevents"
+    )
+    parser.add_argument(
+        "--accept-encoding", default=site_benchmark.DEFAULT_ACCEPT_ENCODING
+    )
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        directory = tempfile.mkdtemp(prefix="response_modes_")
+        database_url = "sqlite:///" + os.path.join(directory, "bench.sqlite")
+
+    seed_args = site_benchmark.parse_args(
+        ["--events", str(args.events), "--distinct-images", "2"]
+    )
+    app = site_benchmark.make_app(database_url)
+    site_benchmark.seed(app, database_url, seed_args)
+    users, events, digests = site_benchmark.load_fixtures(app)
+    base_url = f"http://127.0.0.1:{args.port}"
+    headers = {"Accept-Encoding": args.accept_encoding}
+
+    print(f"database:  {database_url}")
+    print(f"workers:   {args.workers} sync workers, on {os.cpu_count()} cores")
+    print(f"encodings: {args.accept_encoding or 'none'}")
+    print()
+    print(
+        f"{'mode':<22}{'scenario':<14}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}"
+        f"{'TTFB p50':>10}{'TTFB p95':>10}{'bytes':>10}{'on wire':>10}{'errors':>8}"
+    )
+
+    for mode, settings in MODES.items():
+        server = worker_modes.serve(
+            database_url, "sync", args.workers, args.port, settings
+        )
+        try:
+            run_args = site_benchmark.parse_args(
+                [
+                    "--threads",
+                    str(args.threads),
+                    "--requests",
+                    str(args.requests),
+                    "--warmup",
+                    "2",
+                ]
+            )
+            rng = random.Random(0)
+            scenarios = site_benchmark.make_scenarios(users, events, digests, rng)
+            for name, logged_in, prepare in scenarios:
+                if name not in SCENARIOS:
+                    continue
+                result = site_benchmark.run_scenario(
+                    lambda: site_benchmark.HTTPClient(base_url, headers),
+                    users,
+                    prepare,
+                    logged_in,
+                    run_args,
+                    rng,
+                )
+                latency, ttfb = result["latency_ms"], result["ttfb_ms"]
+                print(
+                    f"{mode:<22}{name:<14}{result['throughput']:>8.0f}"
+                    f"{latency['0.5']:>9.1f}{latency['0.95']:>9.1f}"
+                    f"{ttfb['0.5']:>10.1f}{ttfb['0.95']:>10.1f}"
+                    f"{result['bytes']:>10.0f}{result['wire_bytes']:>10.0f}"
+                    f"{result['errors']:>8}"
+                )
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,600 @@
+"""
+Load test and benchmark of the booking site's pages.
+
+Seeds a database with users, events with images, bookings and comments, then
+drives the real routes and reports throughput, latency and time to first byte
+percentiles, and bytes per response before and after compression, for each
+scenario. A run can be saved as a baseline, and later runs compared against it to
+catch regressions.
+
+Usage (from the repository root):
+    python benchmarks/site_benchmark.py --events 500 --requests 200
+    python benchmarks/site_benchmark.py --save-baseline /tmp/site_baseline.json
+    python benchmarks/site_benchmark.py --compare /tmp/site_baseline.json
+    STREAM_TEMPLATES=0 COMPRESS_RESPONSES=0 python benchmarks/site_benchmark.py
+
+To drive a running server instead of the Flask test client, seed its database
+first, then point the benchmark at both:
+    python benchmarks/site_benchmark.py --database-url postgresql://localhost/bench --seed-only
+    python benchmarks/site_benchmark.py --database-url postgresql://localhost/bench --no-seed \\
+        --base-url http://127.0.0.1:8000
+"""
+from datetime import datetime, timedelta
+from http.client import HTTPConnection
+from io import BytesIO
+from urllib.parse import urlencode, urlsplit
+import argparse
+import gzip
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Password of every seeded user
+PASSWORD = "benchmark"
+
+QUANTILES = [0.5, 0.95, 0.99]
+
+# Relative change from the baseline that counts as a regression
+DEFAULT_TOLERANCE = 0.2
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Encodings the clients accept, as a browser would
+DEFAULT_ACCEPT_ENCODING = "br, gzip" if brotli is not None else "gzip"
+
+
+def decode(content, encoding):
+    """
+    Returns the body of a response sent with a content encoding.
+    """
+    if encoding == "gzip":
+        return gzip.decompress(content)
+    if encoding == "br":
+        return brotli.decompress(content)
+    return content
+
+
+def make_app(database_url):
+    from concerts import create_app
+
+    config = {"SQLALCHEMY_DATABASE_URI": database_url, "WTF_CSRF_ENABLED": False}
+    if database_url.startswith("sqlite"):
+        # Wait on the write lock rather than failing straight away
+        config["SQLALCHEMY_ENGINE_OPTIONS"] = {"connect_args": {"timeout": 30}}
+    return create_app(config)
+
+
+def make_photo(width, height, seed):
+    """
+    Returns a JPEG that compresses about as well as a photo of the same size.
+    """
+    from PIL import Image, ImageFilter
+
+    rng = random.Random(seed)
+    channels = [
+        Image.effect_noise((width, height), rng.randint(40, 90)).filter(
+            ImageFilter.GaussianBlur(rng.uniform(1, 3))
+        )
+        for _ in range(3)
+    ]
+    buffer = BytesIO()
+    Image.merge("RGB", channels).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def seed(app, database_url, args):
+    """
+    Creates the schema and seeds users, events with images, bookings and comments.
+    """
+    from flask_migrate import upgrade
+    from sqlalchemy import text
+    from werkzeug.security import generate_password_hash
+    from concerts import db
+    from concerts.images import make_images
+    from concerts.models import Booking, Comment, Event, EventImage, User
+
+    rng = random.Random(args.seed)
+    start = datetime(2021, 1, 1)
+    width, height = args.image_size
+
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, "migrations"))
+        if database_url.startswith("sqlite"):
+            db.session.execute(text("PRAGMA journal_mode=WAL"))
+
+        # Hashing is slow on purpose, so every user shares one hash
+        hash = generate_password_hash(PASSWORD)
+        db.session.bulk_insert_mappings(
+            User,
+            [
+                {
+                    "username": f"bench{i}",
+                    "email": f"bench{i}@example.com",
+                    "hash": hash,
+                    "contact_number": 400000000 + i,
+                    "address": f"{i} Benchmark Street",
+                }
+                for i in range(args.users)
+            ],
+        )
+        db.session.commit()
+        users = db.session.query(User.id, User.username).all()
+
+        # Events reuse a few distinct images, each with all of its variants
+        images = [
+            make_images(BytesIO(make_photo(width, height, args.seed + i)))
+            for i in range(args.distinct_images)
+        ]
+
+        for first in range(0, args.events, 500):
+            for i in range(first, min(first + 500, args.events)):
+                status = rng.choices(["upcoming", "cancelled", "inactive"], [8, 1, 1])
+                event = Event(
+                    timestamp=start + timedelta(hours=rng.randrange(24 * 365 * 10)),
+                    title=f"{rng.choice(['Summer', 'Winter', 'Night'])} concert {i}",
+                    artist=f"{rng.choice(['The', 'A'])} band {i % 97}",
+                    genre=rng.choice(["rock", "pop", "jazz", "metal", "folk"]),
+                    venue_name=f"Hall {i % 31}",
+                    venue_address=f"{i} Venue Road",
+                    status=status[0],
+                    desc="An evening of live music. " * rng.randint(1, 20),
+                    tickets=rng.choice([0, rng.randint(1, 500)]),
+                    price=float(rng.randint(10, 150)),
+                    user_id=rng.choice(users).id,
+                )
+                if images:
+                    event.images = [
+                        EventImage(
+                            kind=image.kind,
+                            mimetype=image.mimetype,
+                            width=image.width,
+                            height=image.height,
+                            digest=image.digest,
+                            data=image.data,
+                        )
+                        for image in images[i % len(images)]
+                    ]
+                db.session.add(event)
+            db.session.commit()
+
+        events = [id for (id,) in db.session.query(Event.id)]
+
+        def timestamp():
+            return start + timedelta(minutes=rng.randrange(60 * 24 * 365 * 10))
+
+        db.session.bulk_insert_mappings(
+            Booking,
+            [
+                {
+                    "timestamp": timestamp(),
+                    "tickets": rng.randint(1, 4),
+                    "price": float(rng.randint(10, 150)),
+                    "user_id": rng.choice(users).id,
+                    "event_id": rng.choice(events),
+                }
+                for _ in range(args.bookings)
+            ],
+        )
+
+        comments = []
+        for _ in range(args.comments):
+            user = rng.choice(users)
+            comments.append(
+                {
+                    "timestamp": timestamp(),
+                    "desc": "Looking forward to it! " * rng.randint(1, 10),
+                    "user_id": user.id,
+                    "username": user.username,
+                    "event_id": rng.choice(events),
+                }
+            )
+        db.session.bulk_insert_mappings(Comment, comments)
+        db.session.commit()
+        db.engine.dispose()
+
+
+def load_fixtures(app):
+    """
+    Returns the ids of seeded users and events, and digests of card images.
+    """
+    from concerts import db
+    from concerts.models import Event, EventImage, User
+
+    with app.app_context():
+        users = [
+            (id, email)
+            for id, email in db.session.query(User.id, User.email).filter(
+                User.email.like("bench%@example.com")
+            )
+        ]
+        events = [
+            (id, price)
+            for id, price in db.session.query(Event.id, Event.price).filter(
+                Event.tickets > 0
+            )
+        ]
+        digests = [
+            digest
+            for (digest,) in db.session.query(EventImage.digest)
+            .filter(EventImage.kind == "card")
+            .distinct()
+        ]
+    return users, events, digests
+
+
+class TestClient:
+    """
+    Issues requests to the app in this process through the Flask test client.
+    The time to the first byte and the bytes sent of the last request are kept.
+    """
+
+    def __init__(self, app, headers=None):
+        self.client = app.test_client()
+        self.headers = headers or {}
+        self.ttfb = 0
+        self.wire_bytes = 0
+
+    def login(self, user_id, email):
+        with self.client.session_transaction() as session:
+            session["_user_id"] = str(user_id)
+            session["_fresh"] = True
+
+    def request(self, method, path, data=None):
+        started = time.perf_counter()
+        response = self.client.open(
+            path, method=method, data=data, headers=self.headers
+        )
+        # Streamed bodies are rendered as they are read
+        chunks = response.iter_encoded()
+        content = next(chunks, b"")
+        self.ttfb = time.perf_counter() - started
+        content += b"".join(chunks)
+        response.close()
+
+        self.wire_bytes = len(content)
+        encoding = response.headers.get("Content-Encoding")
+        return response.status_code, decode(content, encoding)
+
+
+class HTTPClient:
+    """
+    Issues requests to a running server over one keep-alive connection.
+    The time to the first byte and the bytes sent of the last request are kept.
+    """
+
+    def __init__(self, base_url, headers=None):
+        url = urlsplit(base_url)
+        self.connection = HTTPConnection(url.hostname, url.port or 80, timeout=60)
+        self.cookies = {}
+        self.headers = headers or {}
+        self.ttfb = 0
+        self.wire_bytes = 0
+
+    def request(self, method, path, data=None):
+        headers = dict(self.headers)
+        if self.cookies:
+            headers["Cookie"] = "; ".join(
+                name + "=" + value for name, value in self.cookies.items()
+            )
+        body = None
+        if data is not None:
+            body = urlencode(data)
+            headers["Content-Type"] = "application/x-www-form-urlencoded"
+
+        started = time.perf_counter()
+        self.connection.request(method, path, body, headers)
+        # Returns once the status and headers arrive, which are sent with the
+        # first chunk of the body
+        response = self.connection.getresponse()
+        self.ttfb = time.perf_counter() - started
+        content = response.read()
+        for header in response.headers.get_all("Set-Cookie") or []:
+            name, _, value = header.split(";", 1)[0].partition("=")
+            self.cookies[name.strip()] = value
+
+        self.wire_bytes = len(content)
+        encoding = response.headers.get("Content-Encoding")
+        return response.status, decode(content, encoding)
+
+    def form(self, path, data):
+        """
+        Posts a form, with the CSRF token of the page it is on.
+        """
+        status, content = self.request("GET", path)
+        match = re.search(rb'name="csrf_token" type="hidden" value="([^"]+)"', content)
+        if match:
+            data = dict(data, csrf_token=match.group(1).decode())
+        return self.request("POST", path, data)
+
+    def login(self, user_id, email):
+        self.form("/account", {"email": email, "password": PASSWORD})
+
+
+def make_scenarios(users, events, digests, rng):
+    """
+    Returns the scenarios to run, as (name, logged in, prepare) tuples.
+    Each prepare function takes a client and returns the request to time, which
+    returns its status and body.
+    """
+    from concerts.queryplans import LISTING_FILTERS
+
+    def listing(client):
+        query = urlencode(rng.choice(LISTING_FILTERS))
+        return lambda: client.request("GET", "/findevents/?" + query)
+
+    def details(client):
+        id = rng.choice(events)[0]
+        return lambda: client.request("GET", f"/findevents/{id}")
+
+    def comments(client):
+        id = rng.choice(events)[0]
+        return lambda: client.request("GET", f"/findevents/{id}/comments")
+
+    def image(client):
+        digest = rng.choice(digests)
+        return lambda: client.request("GET", "/images/" + digest)
+
+    def book(client):
+        id, price = rng.choice(events)
+        data = {"tickets": 1, "price": price, "event_id": id}
+        if isinstance(client, HTTPClient):
+            # Only the booking itself is timed, not fetching the form's token
+            status, content = client.request("GET", f"/findevents/{id}")
+            match = re.search(
+                rb'name="csrf_token" type="hidden" value="([^"]+)"', content
+            )
+            if match:
+                data["csrf_token"] = match.group(1).decode()
+        return lambda: client.request("POST", f"/findevents/{id}", data)
+
+    def bookedevents(client):
+        return lambda: client.request("GET", "/bookedevents/")
+
+    def myevents(client):
+        return lambda: client.request("GET", "/myevents/")
+
+    scenarios = [
+        ("listing", False, listing),
+        ("listing_user", True, listing),
+        ("details", False, details),
+        ("comments", False, comments),
+        ("book", True, book),
+        ("bookedevents", True, bookedevents),
+        ("myevents", True, myevents),
+    ]
+    if digests:
+        scenarios.insert(4, ("image", False, image))
+    return scenarios
+
+
+def percentile(samples, quantile):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(quantile * len(samples)))]
+
+
+def run_scenario(make_client, users, prepare, logged_in, args, rng):
+    """
+    Runs one scenario from several threads and returns its measurements.
+    """
+    latencies = []
+    ttfbs = []
+    sizes = []
+    wire_sizes = []
+    errors = []
+    lock = threading.Lock()
+
+    def run(count):
+        client = make_client()
+        if logged_in:
+            client.login(*rng.choice(users))
+
+        for i in range(args.warmup + count):
+            request = prepare(client)
+            started = time.perf_counter()
+            status, content = request()
+            elapsed = time.perf_counter() - started
+            if i < args.warmup:
+                continue
+
+            with lock:
+                latencies.append(elapsed)
+                ttfbs.append(client.ttfb)
+                sizes.append(len(content))
+                wire_sizes.append(client.wire_bytes)
+                if status >= 400:
+                    errors.append(status)
+
+    threads = [
+        threading.Thread(target=run, args=(args.requests // args.threads,))
+        for _ in range(args.threads)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "throughput": len(latencies) / elapsed,
+        "latency_ms": {
+            str(quantile): percentile(latencies, quantile) * 1000
+            for quantile in QUANTILES
+        },
+        "ttfb_ms": {
+            str(quantile): percentile(ttfbs, quantile) * 1000 for quantile in QUANTILES
+        },
+        "bytes": sum(sizes) / len(sizes),
+        "wire_bytes": sum(wire_sizes) / len(wire_sizes),
+        "errors": len(errors),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Returns descriptions of the measurements that regressed from the baseline.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+
+        if result["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: throughput {before['throughput']:.0f}/s -> "
+                f"{result['throughput']:.0f}/s"
+            )
+        p95, p95_before = result["latency_ms"]["0.95"], before["latency_ms"]["0.95"]
+        if p95 > p95_before * (1 + tolerance):
+            regressions.append(f"{name}: p95 {p95_before:.1f}ms -> {p95:.1f}ms")
+        if result["bytes"] > before["bytes"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: {before['bytes']:.0f} -> {result['bytes']:.0f} bytes"
+            )
+        # Baselines saved before these were measured don't have them
+        if "ttfb_ms" in before:
+            ttfb, ttfb_before = result["ttfb_ms"]["0.95"], before["ttfb_ms"]["0.95"]
+            if ttfb > ttfb_before * (1 + tolerance):
+                regressions.append(
+                    f"{name}: p95 TTFB {ttfb_before:.1f}ms -> {ttfb:.1f}ms"
+                )
+        if "wire_bytes" in before:
+            if result["wire_bytes"] > before["wire_bytes"] * (1 + tolerance):
+                regressions.append(
+                    f"{name}: {before['wire_bytes']:.0f} -> "
+                    f"{result['wire_bytes']:.0f} bytes on the wire"
+                )
+        if result["errors"] > before["errors"]:
+            regressions.append(
+                f"{name}: {before['errors']} -> {result['errors']} errors"
+            )
+    return regressions
+
+
+def parse_size(value):
+    width, _, height = value.partition("x")
+    return int(width), int(height)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--database-url", help="Defaults to a temporary SQLite database"
+    )
+    parser.add_argument("--base-url", help="Drive a running server instead")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--comments", type=int, default=2000)
+    parser.add_argument(
+        "--image-size", type=parse_size, default=(1600, 900), help="e.g. 1600x900"
+    )
+    parser.add_argument(
+        "--distinct-images",
+        type=int,
+        default=8,
+        help="Images shared between the events, 0 for events without images",
+    )
+    parser.add_argument(
+        "--requests", type=int, default=200, help="Timed requests per scenario"
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=10, help="Untimed requests per thread first"
+    )
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument(
+        "--accept-encoding",
+        default=DEFAULT_ACCEPT_ENCODING,
+        help="Accept-Encoding header of the requests, empty for uncompressed",
+    )
+    parser.add_argument("--scenario", action="append", help="Only run these")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--seed-only", action="store_true")
+    parser.add_argument("--no-seed", action="store_true")
+    parser.add_argument("--save-baseline", metavar="PATH")
+    parser.add_argument("--compare", metavar="PATH")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        directory = tempfile.mkdtemp(prefix="site_benchmark_")
+        database_url = "sqlite:///" + os.path.join(directory, "bench.sqlite")
+
+    app = make_app(database_url)
+    if not args.no_seed:
+        seeding = time.perf_counter()
+        seed(app, database_url, args)
+        print(f"seeded in {time.perf_counter() - seeding:.1f}s")
+    if args.seed_only:
+        return
+
+    users, events, digests = load_fixtures(app)
+    rng = random.Random(args.seed)
+    headers = {"Accept-Encoding": args.accept_encoding}
+    if args.base_url:
+        make_client = lambda: HTTPClient(args.base_url, headers)
+    else:
+        make_client = lambda: TestClient(app, headers)
+
+    print(f"database:    {database_url}")
+    print(f"target:      {args.base_url or 'Flask test client'}")
+    print(f"concurrency: {args.threads} threads")
+    print(f"encodings:   {args.accept_encoding or 'none'}")
+    print()
+    print(
+        f"{'scenario':<14}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'TTFB p50':>10}{'TTFB p95':>10}{'bytes':>10}{'on wire':>10}{'errors':>8}"
+    )
+
+    results = {}
+    for name, logged_in, prepare in make_scenarios(users, events, digests, rng):
+        if args.scenario and name not in args.scenario:
+            continue
+        result = run_scenario(make_client, users, prepare, logged_in, args, rng)
+        results[name] = result
+        latency, ttfb = result["latency_ms"], result["ttfb_ms"]
+        print(
+            f"{name:<14}{result['throughput']:>8.0f}{latency['0.5']:>9.1f}"
+            f"{latency['0.95']:>9.1f}{latency['0.99']:>9.1f}"
+            f"{ttfb['0.5']:>10.1f}{ttfb['0.95']:>10.1f}"
+            f"{result['bytes']:>10.0f}{result['wire_bytes']:>10.0f}"
+            f"{result['errors']:>8}"
+        )
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as file:
+            json.dump(results, file, indent=2)
+        print(f"\nsaved baseline to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        print()
+        if regressions:
+            print("regressions:")
+            for regression in regressions:
+                print("  " + regression)
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%} of {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Benchmark of gunicorn's sync and gevent worker modes.
+
+Seeds a database, then serves it with gunicorn in each worker mode and drives
+the listing and booking routes over HTTP from many concurrent clients, reporting
+the throughput and latency each mode sustains.
+
+Usage (from the repository root, with gunicorn and gevent installed):
+    python benchmarks/worker_modes.py --concurrency 8 --concurrency 32
+    python benchmarks/worker_modes.py --database-url postgresql://localhost/bench
+"""
+import argparse
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import site_benchmark
+
+MODES = ["sync", "gevent"]
+
+
+def wait_for_port(port, timeout=30):
+    """
+    Waits until a server accepts connections on a local port.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"gunicorn did not start on port {port}")
+
+
+def serve(database_url, mode, workers, port, settings=None):
+    """
+    Starts gunicorn serving the app in a worker mode, with settings of the app's
+    environment variables.
+    """
+    environment = dict(
+        os.environ,
+        DATABASE_URL=database_url,
+        GUNICORN_WORKER_CLASS=mode,
+        WEB_CONCURRENCY=str(workers),
+        # Every client logs in from the same address
+        AUTH_IP_BURST="0",
+    )
+    environment.update(settings or {})
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "--bind",
+            f"127.0.0.1:{port}",
+            "concerts:create_app()",
+        ],
+        cwd=ROOT,
+        env=environment,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    wait_for_port(port)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--database-url", help="Defaults to a temporary SQLite database"
+    )
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        action="append",
+        help="Concurrent clients, can be given several times (default 8 and 32)",
+    )
+    parser.add_argument(
+        "--requests", type=int, default=400, help="Timed requests per scenario"
+    )
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        directory = tempfile.mkdtemp(prefix="worker_modes_")
+        database_url = "sqlite:///" + os.path.join(directory, "bench.sqlite")
+
+    seed_args = site_benchmark.parse_args(
+        ["--events", str(args.events), "--distinct-images", "2"]
+    )
+    app = site_benchmark.make_app(database_url)
+    site_benchmark.seed(app, database_url, seed_args)
+    users, events, digests = site_benchmark.load_fixtures(app)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    print(f"database: {database_url}")
+    print(f"workers:  {args.workers} per mode, on {os.cpu_count()} cores")
+    print()
+    print(
+        f"{'mode':<8}{'clients':>8}  {'scenario':<10}{'req/s':>8}{'p50 ms':>9}"
+        f"{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}"
+    )
+
+    for mode in MODES:
+        server = serve(database_url, mode, args.workers, args.port)
+        try:
+            for concurrency in args.concurrency or [8, 32]:
+                run_args = site_benchmark.parse_args(
+                    [
+                        "--threads",
+                        str(concurrency),
+                        "--requests",
+                        str(args.requests),
+                        "--warmup",
+                        "2",
+                    ]
+                )
+                rng = random.Random(0)
+                scenarios = site_benchmark.make_scenarios(users, events, digests, rng)
+                for name, logged_in, prepare in scenarios:
+                    if name not in ("listing", "book"):
+                        continue
+                    result = site_benchmark.run_scenario(
+                        lambda: site_benchmark.HTTPClient(base_url),
+                        users,
+                        prepare,
+                        logged_in,
+                        run_args,
+                        rng,
+                    )
+                    latency = result["latency_ms"]
+                    print(
+                        f"{mode:<8}{concurrency:>8}  {name:<10}"
+                        f"{result['throughput']:>8.0f}{latency['0.5']:>9.1f}"
+                        f"{latency['0.95']:>9.1f}{latency['0.99']:>9.1f}"
+                        f"{result['errors']:>8}"
+                    )
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,26 @@
-from flask import Flask, render_template
+from flask import Flask, flash, redirect, render_template, request, url_for
 from flask_bootstrap import Bootstrap
 from flask_login.login_manager import LoginManager
-from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
+from werkzeug.middleware.proxy_fix import ProxyFix
+import os
 
+from .config import set_defaults
+from .database import RoutingSQLAlchemy
 
-db = SQLAlchemy()
+
+db = RoutingSQLAlchemy()
+migrate = Migrate()
 app = Flask(__name__)
 
 
-def create_app():
+def create_app(test_config=None):
     app.secret_key = "secret_key"
 
+    # Configuration overrides, e.g. a separate database for benchmarks
+    if test_config is not None:
+        app.config.update(test_config)
+
     # Setup bootstrap for quick forms
     bootstrap = Bootstrap(app)
 
@@ -18,6 +28,21 @@ def create_app():
     UPLOAD_FOLDER = "/concerts/static/images"
     app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
 
+    # Limit the size of uploads and spool them to disk
+    from . import images
+
+    images.init_app(app)
+
+    # Build the fingerprinted and precompressed static assets
+    from . import assets
+
+    assets.init_app(app)
+
+    # Compress responses, and stream the listing pages as they are rendered
+    from . import responses
+
+    responses.init_app(app)
+
     # Setup sql alchemy
     from concerts.models import setup_db, db_drop_and_create_all
 
@@ -27,6 +52,36 @@ def create_app():
     # Will manually create database
     # db_drop_and_create_all()
 
+    # Schema changes are applied with "flask db upgrade"
+    migrate.init_app(app, db, render_as_batch=True)
+
+    # Setup the response cache for anonymous listings
+    from . import cache
+
+    cache.init_app(app)
+
+    # Admit bookings to each event at a bounded rate
+    from . import waitingroom
+
+    waitingroom.init_app(app)
+
+    # Record the SQL cost and duration of each request
+    from . import instrumentation
+
+    instrumentation.init_app(app)
+
+    # Behind proxies such as Heroku's router, client addresses are read from the
+    # X-Forwarded-For header, which only the given number of proxies may set
+    set_defaults(app, {"TRUSTED_PROXIES": int(os.getenv("TRUSTED_PROXIES", 0))})
+    if app.config["TRUSTED_PROXIES"]:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["TRUSTED_PROXIES"])
+
+    # Throttle logins and hash passwords in a bounded pool of threads
+    from . import passwords, ratelimit
+
+    passwords.init_app(app)
+    ratelimit.init_app(app)
+
     # Initialize login manager
     login_manager = LoginManager()
     login_manager.login_view = "auth.account"
@@ -38,24 +93,39 @@ def create_app():
     def not_found(e):
         return render_template("pages/404.jinja"), 404
 
+    @app.errorhandler(413)
+    def too_large(e):
+        megabytes = app.config["MAX_CONTENT_LENGTH"] // (1024 * 1024)
+        flash(f"Uploads must be smaller than {megabytes} MB")
+        return redirect(request.referrer or url_for("main.index"))
+
     @app.errorhandler(500)
     def internal_error(e):
         db.session.rollback()
         return render_template("pages/500.jinja"), 500
 
-    # User loader function
-    from .models import User, db_drop_and_create_all
+    # User loader function, users are cached for a short time between requests
+    from . import auth
 
-    @login_manager.user_loader
-    def load_user(id):
-        return User.query.get(int(id))
+    login_manager.user_loader(auth.load_user)
 
     # Add blueprints
-    from . import views, findevents, myevents, bookedevents, auth
+    from . import views, findevents, myevents, bookedevents, auth, images
 
     app.register_blueprint(views.mainbp)
     app.register_blueprint(findevents.bp)
     app.register_blueprint(myevents.bp)
     app.register_blueprint(bookedevents.bp)
     app.register_blueprint(auth.bp)
+    app.register_blueprint(images.bp)
+    app.register_blueprint(assets.bp)
+    app.register_blueprint(instrumentation.bp)
+
+    # Add commands
+    from . import purge, queryplans, sales
+
+    app.cli.add_command(queryplans.check_plans)
+    app.cli.add_command(sales.rebuild_sales)
+    app.cli.add_command(purge.purge_events)
+    app.cli.add_command(assets.build_assets)
     return app
@@ -0,0 +1,319 @@
+from hashlib import sha256
+from urllib.parse import quote
+import gzip
+import json
+import os
+import re
+import click
+from flask import Blueprint, abort, current_app, request, send_from_directory
+from flask import url_for
+from flask.cli import with_appcontext
+
+from .config import set_defaults
+
+bp = Blueprint("assets", __name__, url_prefix="/assets")
+
+# Asset pipeline settings, unless the app config sets them
+ASSETS_DEFAULTS = {
+    # Assets are built when the app starts, as files written by a release phase
+    # don't reach the dynos. Builds skip files that are already up to date
+    "ASSETS_BUILD": os.getenv("ASSETS_BUILD", "1")
+    == "1",
+}
+
+# Files of the static folder that are fingerprinted, and the icon stylesheet made
+# from the Font Awesome icons the templates use
+ASSET_FILES = ["main.css", "main.js", "images/image-regular.png"]
+ICONS_CSS = "icons.css"
+
+# Static files linked instead if the assets haven't been built
+FALLBACKS = {ICONS_CSS: "fontawesome/css/all.min.css"}
+
+MIMETYPES = {
+    ".css": "text/css",
+    ".js": "text/javascript",
+    ".png": "image/png",
+}
+
+# Types worth compressing, images are compressed already
+COMPRESSED_TYPES = {".css", ".js"}
+
+# Precompressed encodings in order of preference, with the suffix of their files
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+# Fingerprinted files never change, so clients keep them for a year without checking
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+MANIFEST = "manifest.json"
+
+# Hex digits of the content hash in fingerprinted filenames
+FINGERPRINT_LENGTH = 12
+
+FONTAWESOME_SVGS = "fontawesome/svgs"
+ICON_STYLES = {"fab": "brands", "far": "regular"}
+ICON_LICENSE = (
+    "Font Awesome Free 5.15.4 by @fontawesome - https://fontawesome.com "
+    "License - https://fontawesome.com/license/free "
+    "(Icons: CC BY 4.0, Fonts: SIL OFL 1.1, Code: MIT License)"
+)
+
+# Icons are drawn as masks of their SVGs, in the text colour, sized like the font
+# icons they replace, 1em high and as wide as the icon's proportions
+ICON_RULES = (
+    ".fa,.fas,.far,.fab{display:inline-block;width:1em;height:1em;"
+    "vertical-align:-.125em;background-color:currentColor;"
+    "-webkit-mask:var(--fa-icon) no-repeat center/contain;"
+    "mask:var(--fa-icon) no-repeat center/contain}"
+)
+ICON_UTILITIES = {
+    "fa-lg": "font-size:1.33333em;vertical-align:-.2em",
+    "fa-xs": "font-size:.75em",
+    "fa-sm": "font-size:.875em",
+    "fa-1x": "font-size:1em",
+    "fa-2x": "font-size:2em",
+    "fa-3x": "font-size:3em",
+    "fa-fw": "width:1.25em",
+}
+
+CLASS_ATTRIBUTE = re.compile(r'class="([^"]*)"')
+SVG_COMMENT = re.compile(r"<!--.*?-->", re.S)
+SVG_VIEWBOX = re.compile(r'viewBox="0 0 (\d+) (\d+)"')
+CSS_COMMENT = re.compile(r"/\*(?!!).*?\*/", re.S)
+CSS_SPACE = re.compile(r"\s*([{};,>])\s*")
+
+
+def fingerprint(filename, data):
+    """
+    Returns a filename with the hash of its content before the extension.
+    """
+    root, extension = os.path.splitext(filename)
+    return f"{root}.{sha256(data).hexdigest()[:FINGERPRINT_LENGTH]}{extension}"
+
+
+def minify_css(text):
+    """
+    Returns a stylesheet without comments and with only the whitespace it needs.
+    Comments starting with /*! are licenses, and are kept.
+    """
+    text = CSS_COMMENT.sub("", text)
+    text = CSS_SPACE.sub(r"\1", text)
+    text = re.sub(r":\s+", ":", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.replace(";}", "}").strip() + "\n"
+
+
+def used_icons(app):
+    """
+    Returns the names and styles of the Font Awesome icons in the templates' classes.
+    """
+    sources = [os.path.join(app.static_folder, "main.js")]
+    templates = os.path.join(app.root_path, app.template_folder)
+    for folder, directories, filenames in os.walk(templates):
+        sources += [os.path.join(folder, filename) for filename in filenames]
+
+    icons = {}
+    for source in sources:
+        with open(source, encoding="utf-8") as file:
+            for attribute in CLASS_ATTRIBUTE.findall(file.read()):
+                classes = attribute.split()
+                style = next(
+                    (ICON_STYLES[name] for name in classes if name in ICON_STYLES),
+                    "solid",
+                )
+                for name in classes:
+                    if name.startswith("fa-") and name not in ICON_UTILITIES:
+                        icons[name[3:]] = style
+    return icons
+
+
+def icon_rule(name, svg):
+    """
+    Returns the rule of an icon, with its SVG inlined as a data URI.
+    """
+    width, height = SVG_VIEWBOX.search(svg).groups()
+    svg = SVG_COMMENT.sub("", svg).replace('"', "'").strip()
+    uri = "data:image/svg+xml," + quote(svg, safe=" '/=:.,-")
+    width = round(int(width) / int(height), 4)
+    return f'.fa-{name}{{width:{width:g}em;--fa-icon:url("{uri}")}}'
+
+
+def make_icons_css(app):
+    """
+    Returns a stylesheet of only the icons and utility classes the templates use.
+    """
+    rules = [f"/*! {ICON_LICENSE} */", ICON_RULES]
+    svgs = os.path.join(app.static_folder, FONTAWESOME_SVGS)
+    for name, style in sorted(used_icons(app).items()):
+        path = os.path.join(svgs, style, name + ".svg")
+        if not os.path.exists(path):
+            app.logger.warning(f"Font Awesome has no {style} icon named {name}")
+            continue
+        with open(path, encoding="utf-8") as file:
+            rules.append(icon_rule(name, file.read()))
+
+    # Utilities come last, so fa-fw's width overrides the icons' own
+    rules += [f".{name}{{{rule}}}" for name, rule in ICON_UTILITIES.items()]
+    return "\n".join(rules) + "\n"
+
+
+def compress(data):
+    """
+    Returns the precompressed variants of a file, keyed by encoding.
+    Only variants smaller than the file are kept. Brotli is optional.
+    """
+    variants = {"gzip": gzip.compress(data, 9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        variants["br"] = brotli.compress(data, quality=11)
+
+    return {
+        encoding: variant
+        for encoding, variant in variants.items()
+        if len(variant) < len(data)
+    }
+
+
+def write_file(path, data):
+    """
+    Writes a file unless it already exists, through a temporary file, so workers
+    building at once never serve a partly written file.
+    """
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+def build(app):
+    """
+    Writes the fingerprinted and precompressed assets and their manifest,
+    and returns the manifest.
+    """
+    folder = app.config["ASSETS_FOLDER"]
+    sources = {}
+    for filename in ASSET_FILES:
+        with open(os.path.join(app.static_folder, filename), "rb") as file:
+            sources[filename] = file.read()
+    sources["main.css"] = minify_css(sources["main.css"].decode()).encode()
+    sources[ICONS_CSS] = make_icons_css(app).encode()
+
+    manifest = {}
+    for filename, data in sources.items():
+        path = fingerprint(filename, data)
+        write_file(os.path.join(folder, path), data)
+
+        encodings = []
+        if os.path.splitext(filename)[1] in COMPRESSED_TYPES:
+            for encoding, variant in compress(data).items():
+                write_file(os.path.join(folder, path + ENCODINGS[encoding]), variant)
+                encodings.append(encoding)
+        manifest[filename] = {"path": path, "size": len(data), "encodings": encodings}
+
+    # Rewritten every time, as a manifest of an older build would link old files
+    manifest_path = os.path.join(folder, MANIFEST)
+    temporary = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(temporary, "w") as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(temporary, manifest_path)
+    return manifest
+
+
+def load_manifest(app):
+    """
+    Returns the manifest of the last build, or an empty one if there was none.
+    """
+    try:
+        with open(os.path.join(app.config["ASSETS_FOLDER"], MANIFEST)) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+
+
+def init_app(app):
+    """
+    Sets the asset defaults, builds the assets and loads their manifest.
+    If the assets can't be built, pages link to the plain static files.
+    """
+    set_defaults(app, ASSETS_DEFAULTS)
+    set_defaults(app, {"ASSETS_FOLDER": os.path.join(app.static_folder, "dist")})
+
+    manifest = None
+    if app.config["ASSETS_BUILD"]:
+        try:
+            manifest = build(app)
+        except OSError as error:
+            app.logger.warning(f"Could not build the static assets: {error}")
+    if manifest is None:
+        manifest = load_manifest(app)
+
+    app.extensions["assets"] = {
+        "manifest": manifest,
+        "files": {
+            entry["path"]: (os.path.splitext(filename)[1], entry["encodings"])
+            for filename, entry in manifest.items()
+        },
+    }
+
+
+@bp.app_template_global()
+def static_url(filename):
+    """
+    Returns the URL of a static file's fingerprinted asset, or of the file itself
+    if it isn't one of the built assets.
+    """
+    entry = current_app.extensions["assets"]["manifest"].get(filename)
+    if entry is None:
+        return url_for("static", filename=FALLBACKS.get(filename, filename))
+    return url_for("assets.show", filename=entry["path"])
+
+
+@bp.route("/<path:filename>")
+def show(filename):
+    """
+    Serves a fingerprinted asset, precompressed with the best encoding the client
+    accepts, to be cached for good.
+    """
+    asset = current_app.extensions["assets"]["files"].get(filename)
+    if asset is None:
+        abort(404)
+    extension, encodings = asset
+
+    encoding = next(
+        (
+            encoding
+            for encoding in ENCODINGS
+            if encoding in encodings and request.accept_encodings[encoding]
+        ),
+        None,
+    )
+    path = filename + ENCODINGS[encoding] if encoding else filename
+
+    response = send_from_directory(
+        current_app.config["ASSETS_FOLDER"], path, mimetype=MIMETYPES[extension]
+    )
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    if encodings:
+        response.vary.add("Accept-Encoding")
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
+
+
+@click.command("build-assets")
+@with_appcontext
+def build_assets():
+    """
+    Builds the fingerprinted and precompressed static assets.
+    """
+    manifest = build(current_app)
+    for filename, entry in sorted(manifest.items()):
+        encodings = ", ".join(entry["encodings"]) or "uncompressed"
+        click.echo(
+            f"{filename} -> {entry['path']} ({entry['size']} bytes, {encodings})"
+        )
@@ -1,14 +1,89 @@
-from flask import Blueprint, render_template, redirect, url_for, flash
-from werkzeug.security import generate_password_hash, check_password_hash
+from time import time
+import json
+from flask import Blueprint, render_template, redirect, url_for, flash, current_app
+from flask import make_response, request
 from flask_login import login_user, login_required, logout_user
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.orm import load_only, make_transient_to_detached
 
+from .cache import USER_CACHE, get_cache
 from .forms import LoginForm, RegisterForm
 from .models import User
+from .passwords import check_password, hash_password, needs_rehash
+from .ratelimit import AUTH_EMAIL, AUTH_IP, limit
 from . import db
 
 
 bp = Blueprint("auth", __name__)
 
+# Columns of a logged in user kept in the user cache, the password hash is left out
+USER_COLUMNS = ["id", "username", "email", "contact_number", "address"]
+
+
+def load_user(id):
+    """
+    Returns the logged in user, from the user cache if it was loaded recently.
+    """
+    cache = get_cache(USER_CACHE)
+    key = "user:" + str(id)
+
+    cached = cache and cache.get(key)
+    if cached is not None:
+        cached = json.loads(cached)
+        if cached["expires"] > time():
+            # Attach the cached user to the session without querying it
+            user = User(**cached["user"])
+            make_transient_to_detached(user)
+            return db.session.merge(user, load=False)
+
+    user = User.query.options(load_only(*USER_COLUMNS)).get(int(id))
+    if user is not None and cache is not None:
+        ttl = current_app.config["USER_CACHE_TTL"]
+        cached = {
+            "expires": time() + ttl,
+            "user": {column: getattr(user, column) for column in USER_COLUMNS},
+        }
+        cache.set(key, json.dumps(cached).encode())
+
+    return user
+
+
+@sqlalchemy_event.listens_for(User, "after_update")
+@sqlalchemy_event.listens_for(User, "after_delete")
+def invalidate_user(mapper, connection, user):
+    """
+    Removes a user from the user cache when their profile changes.
+    """
+    cache = get_cache(USER_CACHE)
+    if cache is not None:
+        cache.delete("user:" + str(user.id))
+
+
+@bp.before_request
+def limit_attempts():
+    """
+    Rate limits login and register attempts from each client address, and at each
+    email, before any password is hashed.
+    """
+    if request.method == "POST":
+        limit(AUTH_IP, request.remote_addr)
+        limit(AUTH_EMAIL, request.form.get("email", "").strip().lower())
+
+
+@bp.errorhandler(429)
+@bp.errorhandler(503)
+def too_many_attempts(error):
+    """
+    Renders the login page with the reason the attempt was turned away.
+    """
+    flash(error.description)
+    response = make_response(
+        render_template("pages/account.jinja", loginform=LoginForm()), error.code
+    )
+    if error.retry_after is not None:
+        response.headers["Retry-After"] = str(error.retry_after)
+    return response
+
 
 @bp.route("/account", methods=["GET", "POST"])
 def account():
@@ -26,10 +101,14 @@ def account():
 
         if user is None:
             error = "Incorrect email"
-        elif not check_password_hash(user.hash, password):
+        elif not check_password(user.hash, password):
             error = "Incorrect password"
 
         if error is None:
+            # Upgrade the hash while the password is at hand, if the method changed
+            if needs_rehash(user.hash):
+                user.hash = hash_password(password)
+                db.session.commit()
             login_user(user)
         else:
             flash(error)
@@ -60,7 +139,7 @@ def register():
             error = "Email already exists"
 
         if error is None:
-            hash = generate_password_hash(password)
+            hash = hash_password(password)
             user = User(
                 username=username,
                 email=email,
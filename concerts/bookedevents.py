@@ -1,41 +1,65 @@
-from flask import Blueprint, render_template, flash
+from flask import Blueprint, flash, request
 from flask_login import login_required, current_user
+from sqlalchemy.orm import contains_eager
 
-from .models import Event
+from .models import Booking, Event
+from .pagination import paginate
+from .responses import stream_template
 
 bp = Blueprint("bookedevents", __name__, url_prefix="/bookedevents")
 
+BOOKINGS_PER_PAGE = 20
+
+# Event columns shown in a booked event's card
+EVENT_CARD_COLUMNS = [
+    Event.id,
+    Event.timestamp,
+    Event.title,
+    Event.artist,
+    Event.genre,
+    Event.venue_name,
+    Event.venue_address,
+    Event.status,
+    Event.desc,
+    Event.tickets,
+    Event.version,
+]
+
 
 @bp.route("/", methods=["GET", "POST"])
 @login_required
 def show():
     """
     Renders the bookedevents page by querying bookings with the current user's id.
+    Bookings are loaded together with their events, a page at a time.
     Requires the user to be logged in.
     """
     error = None
-    bookings = current_user.bookings
+    query = (
+        Booking.query.filter(Booking.user_id == current_user.id)
+        .join(Booking.event)
+        .filter(Event.deleted_at.is_(None))
+        .options(contains_eager(Booking.event).load_only(*EVENT_CARD_COLUMNS))
+    )
+
+    page = paginate(
+        query,
+        [Booking.timestamp, Booking.id],
+        request.args.get("cursor"),
+        BOOKINGS_PER_PAGE,
+    )
+    bookings = page.items
 
     # Check if current_user has any bookings
     if bookings == []:
         error = "No bookings found"
-    else:
-        for booking in bookings:
-            # Get an event by its id, and attach it to the booking object
-            # This is required since a booking only has a booking_id attribute
-            event = Event.query.get(booking.event_id)
-            setattr(booking, "event", event)
-
-            # If the status is upcoming, but there are no tickets available, set the status display to booked
-            if event.tickets == 0 and event.status == "upcoming":
-                setattr(event, "status_display", "booked")
-            else:
-                setattr(event, "status_display", event.status)
 
     if error:
         flash(error)
 
-    return render_template(
+    return stream_template(
         "pages/bookedevents.jinja",
         bookings=enumerate(bookings),
+        page=page,
+        page_args={},
     )
@@ -0,0 +1,102 @@
+from datetime import datetime
+from random import random
+from time import sleep
+from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
+
+from .cache import EVENTS_VERSION, bump_version
+from .models import Booking, Event
+from .sales import record_sale
+from . import db
+
+# Results of a booking attempt
+BOOKED = "booked"
+NOT_ENOUGH_TICKETS = "not enough tickets"
+EVENT_NOT_FOUND = "event not found"
+INVALID_TICKETS = "invalid tickets"
+BUSY = "busy"
+
+# Lock contention is retried with jittered exponential backoff, starting at BACKOFF seconds
+RETRIES = 5
+BACKOFF = 0.01
+
+
+def book_tickets(event_id, user_id, tickets):
+    """
+    Books tickets for an event and returns one of the booking results.
+    Tickets are taken with a single conditional update, so concurrent bookings
+    can never take more tickets than are available.
+    """
+    if tickets is None or tickets < 1:
+        return INVALID_TICKETS
+
+    for attempt in range(RETRIES):
+        try:
+            result = try_book_tickets(event_id, user_id, tickets)
+            break
+        except OperationalError:
+            # SQLite reports a locked database, PostgreSQL a serialization failure or deadlock
+            db.session.rollback()
+            sleep(BACKOFF * 2 ** attempt * (0.5 + random()))
+    else:
+        return BUSY
+
+    # Outside the retry loop, since the booking has already been committed
+    if result == BOOKED:
+        invalidate_listings()
+    return result
+
+
+def invalidate_listings():
+    """
+    Bumps the events cache version, as the listings show the number of tickets left.
+    A failure only leaves the cached listings stale, so it never fails the booking.
+    """
+    try:
+        bump_version(EVENTS_VERSION)
+    except SQLAlchemyError as error:
+        db.session.rollback()
+        current_app.logger.warning(f"Could not invalidate the event listings: {error}")
+
+
+def try_book_tickets(event_id, user_id, tickets):
+    """
+    Makes one attempt at booking tickets in a single transaction.
+    """
+    result = db.session.execute(
+        update(Event.__table__)
+        .where(
+            Event.id == event_id,
+            Event.tickets >= tickets,
+            Event.deleted_at.is_(None),
+        )
+        .values(tickets=Event.tickets - tickets, version=Event.version + 1)
+    )
+
+    # If no row was updated, either the event does not exist or it has too few tickets
+    if result.rowcount == 0:
+        exists = (
+            db.session.query(Event.id)
+            .filter(Event.id == event_id, Event.deleted_at.is_(None))
+            .scalar()
+        )
+        db.session.rollback()
+        return NOT_ENOUGH_TICKETS if exists else EVENT_NOT_FOUND
+
+    # The event row is now locked by this transaction, so the price can't change under it
+    price, organiser_id = (
+        db.session.query(Event.price, Event.user_id).filter(Event.id == event_id).one()
+    )
+    timestamp = datetime.now()
+    booking = Booking(
+        timestamp=timestamp,
+        tickets=tickets,
+        price=price,
+        event_id=event_id,
+        user_id=user_id,
+    )
+    db.session.add(booking)
+    record_sale(event_id, organiser_id, timestamp.date(), tickets, price)
+    db.session.commit()
+    return BOOKED
@@ -0,0 +1,396 @@
+import csv
+from datetime import datetime
+from io import StringIO
+from shutil import copyfileobj
+from tempfile import TemporaryFile
+import json
+from sqlalchemy import insert
+from werkzeug.datastructures import MultiDict
+
+from .cache import EVENTS_VERSION, bump_version
+from .forms import EventForm
+from .models import Booking, Event
+from . import db
+
+# Columns of an imported event, in the order they are exported
+EVENT_FIELDS = [
+    "title",
+    "artist",
+    "genre",
+    "timestamp",
+    "venue_name",
+    "venue_address",
+    "desc",
+    "status",
+    "tickets",
+    "price",
+]
+BOOKING_FIELDS = [
+    "id",
+    "timestamp",
+    "event_id",
+    "event_title",
+    "event_timestamp",
+    "tickets",
+    "price",
+]
+
+# Same format as the HTML datetime-local input of the event editor
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M"
+
+# Valid rows are inserted this many at a time, each batch in its own transaction
+IMPORT_BATCH_SIZE = 500
+
+# Only the first errors are kept, so a file of bad rows can't exhaust memory
+MAX_REPORTED_ERRORS = 100
+
+# Exported rows are fetched this many at a time, and sent in chunks of about this size
+EXPORT_BATCH_SIZE = 500
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+EXPORT_FORMATS = {"csv": "text/csv", "json": "application/json"}
+
+
+class ImportResult:
+    """
+    The number of events imported and skipped, and the errors of skipped rows.
+    If the rest of a file could not be read, failure holds the reason.
+    """
+
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0
+        self.errors = []
+        self.error_count = 0
+        self.failure = None
+
+    def add_error(self, number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((number, message))
+
+
+def normalise_row(row):
+    """
+    Returns the fields of an event row as strings, keyed by lower case column names.
+    """
+    values = {}
+    for name, value in row.items():
+        if name is None or value is None:
+            continue
+        name = str(name).strip().lower()
+        if isinstance(value, datetime):
+            value = value.strftime(TIMESTAMP_FORMAT)
+        values[name] = str(value).strip()
+    return values
+
+
+def decode_lines(file, bad_lines):
+    """
+    Yields the lines of a UTF-8 file as text, without its byte order mark.
+    Spooled uploads can't be wrapped in a TextIOWrapper before Python 3.11, so the
+    file's lines are read and decoded one at a time instead. Lines that aren't
+    UTF-8 are decoded with replacement characters, and their numbers added to bad_lines.
+    """
+    for number, line in enumerate(file, 1):
+        encoding = "utf-8-sig" if number == 1 else "utf-8"
+        try:
+            yield line.decode(encoding)
+        except UnicodeDecodeError:
+            bad_lines.append(number)
+            yield line.decode(encoding, errors="replace")
+
+
+def read_csv(file):
+    """
+    Yields the line number and fields of each row of a CSV file with a header row.
+    Rows that can't be read are yielded with an error message in place of their fields.
+    """
+    bad_lines = []
+    reader = csv.DictReader(decode_lines(file, bad_lines))
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as error:
+            bad_lines.clear()
+            yield reader.line_num, f"The row could not be read: {error}"
+            continue
+
+        if bad_lines:
+            bad_lines.clear()
+            yield reader.line_num, "The row is not valid UTF-8 text"
+        else:
+            yield reader.line_num, normalise_row(row)
+
+
+def json_fields(row):
+    """
+    Returns the fields of a JSON object, or an error message if it isn't an object.
+    """
+    if not isinstance(row, dict):
+        return "The item is not a JSON object"
+    return normalise_row(row)
+
+
+def read_json(file):
+    """
+    Yields the number and fields of each object in a JSON array, or of each line
+    of a JSON Lines file. Lines are read one at a time, and a line that isn't valid
+    is yielded with an error message in place of its fields. An array is parsed
+    whole, within the request size limit, so it is imported only if it is valid.
+    """
+    first = file.read(1)
+    while first.isspace():
+        first = file.read(1)
+    if not first:
+        return
+    file.seek(file.tell() - 1)
+
+    if first == b"[":
+        try:
+            rows = json.load(file)
+        except ValueError as error:
+            raise ValueError(f"The JSON file is not valid: {error}")
+        for number, row in enumerate(rows, 1):
+            yield number, json_fields(row)
+        return
+
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as error:
+            # Also raised for lines that aren't UTF-8
+            yield number, f"The line is not valid JSON: {error}"
+        else:
+            yield number, json_fields(row)
+
+
+def read_xlsx(file):
+    """
+    Yields the row number and fields of each row of the first sheet of a workbook,
+    whose first row holds the column names.
+    The sheet is read in openpyxl's read only mode, a row at a time.
+    """
+    from openpyxl import load_workbook
+
+    # Spooled uploads have no seekable() before Python 3.11, which zipfile needs,
+    # so they are copied to a temporary file first
+    with TemporaryFile() as copy:
+        if not hasattr(file, "seekable"):
+            copyfileobj(file, copy)
+            copy.seek(0)
+            file = copy
+
+        try:
+            workbook = load_workbook(file, read_only=True, data_only=True)
+        except Exception as error:
+            raise ValueError(f"The XLSX file could not be read: {error}")
+
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header = next(rows, None) or []
+            for number, values in enumerate(rows, 2):
+                if any(value is not None for value in values):
+                    yield number, normalise_row(dict(zip(header, values)))
+        finally:
+            workbook.close()
+
+
+READERS = {"csv": read_csv, "json": read_json, "jsonl": read_json, "xlsx": read_xlsx}
+
+
+def read_rows(file, filename):
+    """
+    Returns the rows of an import file, read with the reader for its extension.
+    """
+    extension = filename.rsplit(".", 1)[-1].lower()
+    if extension not in READERS:
+        raise ValueError("Import files must be CSV, JSON or XLSX")
+    return READERS[extension](file)
+
+
+def validate_event(row, now):
+    """
+    Returns the column values of an event row, and the errors that stop it being imported.
+    Rows are checked with the event editor's form, so they are held to the same rules.
+    """
+    form = EventForm(formdata=MultiDict(row), meta={"csrf": False})
+    valid = form.validate()
+    errors = [
+        f"{field.label.text}: {error}" for field in form for error in field.errors
+    ]
+
+    timestamp = None
+    if form.timestamp.data:
+        try:
+            timestamp = datetime.strptime(form.timestamp.data, TIMESTAMP_FORMAT)
+        except ValueError:
+            errors.append("Date and time: Enter it as YYYY-MM-DDTHH:MM")
+        else:
+            if timestamp < now:
+                errors.append("Date and time: Cannot create an event in the past")
+
+    if not valid or errors:
+        return None, errors
+
+    values = {name: form[name].data for name in EVENT_FIELDS}
+    values["timestamp"] = timestamp
+    return values, []
+
+
+def insert_events(batch):
+    """
+    Inserts a batch of events in one executemany statement and transaction.
+    """
+    db.session.execute(insert(Event.__table__), batch)
+    db.session.commit()
+
+
+def import_events(rows, user_id, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Validates rows of events as they are read and imports the valid ones for a user.
+    Rows with errors are skipped and reported, the rest are inserted in batches.
+    If the rest of the file can't be read, the rows before it are still imported.
+    """
+    result = ImportResult()
+    now = datetime.now()
+    batch = []
+
+    try:
+        try:
+            for number, row in rows:
+                # Rows that could not be read come with an error message instead
+                if isinstance(row, str):
+                    result.add_error(number, row)
+                    result.skipped += 1
+                    continue
+
+                values, errors = validate_event(row, now)
+                for error in errors:
+                    result.add_error(number, error)
+                if values is None:
+                    result.skipped += 1
+                    continue
+
+                values["user_id"] = user_id
+                batch.append(values)
+                if len(batch) >= batch_size:
+                    insert_events(batch)
+                    result.imported += len(batch)
+                    batch = []
+        except ValueError as error:
+            # The rows read before the file broke off are still imported
+            result.failure = str(error)
+
+        if batch:
+            insert_events(batch)
+            result.imported += len(batch)
+    finally:
+        # The listings show the imported events, even if an insert failed midway
+        if result.imported:
+            bump_version(EVENTS_VERSION)
+
+    return result
+
+
+def event_rows(user_id):
+    """
+    Yields the events of a user as dicts, fetching them a batch at a time.
+    """
+    columns = [Event.id] + [getattr(Event, name) for name in EVENT_FIELDS]
+    query = (
+        db.session.query(*columns)
+        .filter(Event.user_id == user_id, Event.deleted_at.is_(None))
+        .order_by(Event.id)
+        .yield_per(EXPORT_BATCH_SIZE)
+    )
+    for row in query:
+        values = dict(zip(["id"] + EVENT_FIELDS, row))
+        if values["timestamp"] is not None:
+            values["timestamp"] = values["timestamp"].strftime(TIMESTAMP_FORMAT)
+        yield values
+
+
+def booking_rows(user_id):
+    """
+    Yields the bookings of a user with their event's title and time, a batch at a time.
+    """
+    query = (
+        db.session.query(
+            Booking.id,
+            Booking.timestamp,
+            Booking.event_id,
+            Event.title,
+            Event.timestamp,
+            Booking.tickets,
+            Booking.price,
+        )
+        .join(Event, Booking.event_id == Event.id)
+        .filter(Booking.user_id == user_id, Event.deleted_at.is_(None))
+        .order_by(Booking.timestamp, Booking.id)
+        .yield_per(EXPORT_BATCH_SIZE)
+    )
+    for row in query:
+        values = dict(zip(BOOKING_FIELDS, row))
+        for name in ("timestamp", "event_timestamp"):
+            if values[name] is not None:
+                values[name] = values[name].isoformat(timespec="seconds")
+        yield values
+
+
+EXPORTS = {
+    "events": (["id"] + EVENT_FIELDS, event_rows),
+    "bookings": (BOOKING_FIELDS, booking_rows),
+}
+
+
+def export_csv(fields, rows):
+    """
+    Yields a CSV file of rows in chunks.
+    """
+    buffer = StringIO()
+    writer = csv.DictWriter(buffer, fields)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_json(fields, rows):
+    """
+    Yields a JSON array of rows in chunks.
+    """
+    chunk = []
+    size = 0
+    separator = "[\n"
+    for row in rows:
+        line = separator + json.dumps(row)
+        separator = ",\n"
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield "".join(chunk)
+            chunk = []
+            size = 0
+    chunk.append("[]\n" if separator == "[\n" else "\n]\n")
+    yield "".join(chunk)
+
+
+EXPORT_WRITERS = {"csv": export_csv, "json": export_json}
+
+
+def export(dataset, format, user_id):
+    """
+    Yields a user's events or bookings as a CSV or JSON file, in chunks, without
+    loading every row at once.
+    """
+    fields, rows = EXPORTS[dataset]
+    return EXPORT_WRITERS[format](fields, rows(user_id))
@@ -0,0 +1,275 @@
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock, local
+from urllib.parse import urlencode
+import os
+import sqlite3
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from .config import set_defaults
+from .models import CacheVersion
+from . import db
+
+# Name of the cache version bumped whenever events or their tickets change
+EVENTS_VERSION = "events"
+
+# Caches of whole listing responses, rendered fragments of pages and logged in users
+RESPONSE_CACHE = "RESPONSE_CACHE"
+FRAGMENT_CACHE = "FRAGMENT_CACHE"
+USER_CACHE = "USER_CACHE"
+
+# Entries kept by each cache before the oldest are evicted
+DEFAULT_SIZES = {RESPONSE_CACHE: 512, FRAGMENT_CACHE: 4096, USER_CACHE: 1024}
+
+CACHE_DEFAULTS = {
+    **{name: "memory" for name in DEFAULT_SIZES},
+    **{name + "_SIZE": size for name, size in DEFAULT_SIZES.items()},
+    # Seconds a cached user is used for, which bounds how stale other workers can be
+    "USER_CACHE_TTL": 60,
+}
+
+
+class MemoryCache:
+    """
+    A least recently used cache in the memory of one worker process.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+class SQLiteCache:
+    """
+    A cache in a local SQLite file, shared by every worker process on the machine.
+    The oldest entries are evicted first.
+    """
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.local = local()
+        self.connect().execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value BLOB)"
+        )
+
+    def connect(self):
+        # SQLite connections can't be shared between threads, so keep one per thread
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            self.local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = (
+            self.connect()
+            .execute("SELECT value FROM responses WHERE key = ?", (key,))
+            .fetchone()
+        )
+        return None if row is None else row[0]
+
+    def set(self, key, value):
+        connection = self.connect()
+        try:
+            # Replacing a row gives it a new rowid, so rowids follow insertion order
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value) VALUES (?, ?)",
+                (key, value),
+            )
+            connection.execute(
+                "DELETE FROM responses WHERE rowid <= "
+                "(SELECT max(rowid) FROM responses) - ?",
+                (self.size,),
+            )
+        except sqlite3.OperationalError:
+            # The cache is only an optimisation, so skip storing if it is busy
+            pass
+
+    def delete(self, key):
+        self.connect().execute("DELETE FROM responses WHERE key = ?", (key,))
+
+
+class ResponseCache:
+    """
+    Wraps a cache backend and counts its hits and misses.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.backend.set(key, value)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def init_app(app):
+    """
+    Sets up the response, fragment and user caches from the RESPONSE_CACHE,
+    FRAGMENT_CACHE and USER_CACHE config. "memory" caches in each worker, "sqlite"
+    in a file shared by all workers, and "none" disables caching. Any object with
+    get, set and delete methods can also be given.
+    """
+    set_defaults(app, CACHE_DEFAULTS)
+
+    for name in DEFAULT_SIZES:
+        backend = app.config[name]
+        size = app.config[name + "_SIZE"]
+
+        if backend == "memory":
+            backend = MemoryCache(size)
+        elif backend == "sqlite":
+            path = app.config.get(name + "_PATH")
+            if path is None:
+                os.makedirs(app.instance_path, exist_ok=True)
+                path = os.path.join(app.instance_path, name.lower() + ".sqlite")
+            backend = SQLiteCache(path, size)
+        elif backend == "none":
+            backend = None
+
+        app.extensions[name.lower()] = backend and ResponseCache(backend)
+
+
+def get_cache(name=RESPONSE_CACHE):
+    """
+    Returns a cache of the current app, or None if that cache is disabled.
+    """
+    return current_app.extensions.get(name.lower())
+
+
+def get_version(name):
+    """
+    Returns the current version of cached data.
+    """
+    version = (
+        db.session.query(CacheVersion.version)
+        .filter(CacheVersion.name == name)
+        .scalar()
+    )
+    return version or 0
+
+
+def bump_version(name):
+    """
+    Invalidates cached data by moving it to a new version.
+    Called after the write has been committed, so a response cached under the new
+    version can't have been rendered from the old data.
+    """
+    result = db.session.execute(
+        update(CacheVersion.__table__)
+        .where(CacheVersion.name == name)
+        .values(version=CacheVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.session.add(CacheVersion(name=name, version=1))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker created the version first, which invalidates just the same
+        db.session.rollback()
+
+
+def cache_stream(cache, key, chunks):
+    """
+    Yields the chunks of a streamed response, and caches the response once it has
+    all been sent. A response cut off by the client is not cached.
+    """
+    sent = []
+    for chunk in chunks:
+        sent.append(chunk)
+        yield chunk
+    cache.set(key, b"".join(sent))
+
+
+def cached_listing(name, args):
+    """
+    Caches the responses of a view for anonymous users, until version name is bumped.
+    Responses are keyed by the view's path and the given URL parameters, ignoring
+    empty parameters and parameter order.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*view_args, **view_kwargs):
+            cache = get_cache()
+
+            # Pages with flashed messages or a logged in user are never shared
+            if (
+                cache is None
+                or request.method != "GET"
+                or current_user.is_authenticated
+                or "_flashes" in session
+            ):
+                return view(*view_args, **view_kwargs)
+
+            params = sorted(
+                (key, value)
+                for key, value in request.args.items(multi=True)
+                if key in args and value != ""
+            )
+            key = f"{get_version(name)}:{request.path}?{urlencode(params)}"
+
+            html = cache.get(key)
+            if html is not None:
+                response = make_response(html.decode())
+                response.headers["X-Cache"] = "HIT"
+                return response
+
+            response = make_response(view(*view_args, **view_kwargs))
+            if response.status_code == 200 and response.mimetype == "text/html":
+                if response.is_streamed:
+                    response.response = cache_stream(
+                        cache, key, response.iter_encoded()
+                    )
+                else:
+                    cache.set(key, response.get_data())
+            response.headers["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+
+    return decorator
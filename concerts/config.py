@@ -0,0 +1,6 @@
+def set_defaults(app, defaults):
+    """
+    Sets each of the default settings that the app config doesn't already set.
+    """
+    for key, value in defaults.items():
+        app.config.setdefault(key, value)
@@ -0,0 +1,145 @@
+from functools import wraps
+import os
+import sqlite3
+from flask import g, has_request_context
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy import orm
+from sqlalchemy.pool import Pool, QueuePool
+
+from .config import set_defaults
+
+# Bind of the read replica, used by read only views if it is configured
+REPLICA = "replica"
+
+# Engine settings used where the app config leaves them out
+ENGINE_DEFAULTS = {
+    # Connections kept by each worker process, and extra ones opened under load
+    "DATABASE_POOL_SIZE": int(os.getenv("DATABASE_POOL_SIZE", 5)),
+    "DATABASE_MAX_OVERFLOW": int(os.getenv("DATABASE_MAX_OVERFLOW", 10)),
+    # Seconds to wait for a free connection before failing the request
+    "DATABASE_POOL_TIMEOUT": 10,
+    # Seconds after which connections are replaced, before servers drop them
+    "DATABASE_POOL_RECYCLE": 1800,
+    "DATABASE_PRE_PING": True,
+    # Milliseconds a PostgreSQL statement may run for, 0 for no limit
+    "DATABASE_STATEMENT_TIMEOUT": 30000,
+    # Milliseconds to wait on SQLite's write lock before "database is locked"
+    "SQLITE_BUSY_TIMEOUT": 5000,
+    "SQLITE_JOURNAL_MODE": "WAL",
+    "SQLITE_SYNCHRONOUS": "NORMAL",
+}
+
+# Pragmas applied to every new SQLite connection
+sqlite_pragmas = {}
+
+
+def database_url(url):
+    """
+    Returns a database URL that SQLAlchemy accepts.
+    Heroku still provides postgres:// URLs, which SQLAlchemy 1.4 no longer accepts.
+    """
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://") :]
+    return url
+
+
+def make_green():
+    """
+    Makes the PostgreSQL driver wait on queries cooperatively, for gevent workers.
+    gevent patches Python's sockets, but psycopg2 talks to the server in C and would
+    otherwise block every greenlet of the worker until each query returns.
+    """
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        return
+
+    patch_psycopg()
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Applies the configured pragmas to a new SQLite connection.
+    """
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        for name, value in sqlite_pragmas.items():
+            dbapi_connection.execute(f"PRAGMA {name} = {value}")
+
+
+def configure_engine(app):
+    """
+    Sets the engine options from the app config, unless they are already set in
+    SQLALCHEMY_ENGINE_OPTIONS.
+    """
+    set_defaults(app, ENGINE_DEFAULTS)
+    config = app.config
+
+    url = config["SQLALCHEMY_DATABASE_URI"]
+    options = config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+    connect_args = options.setdefault("connect_args", {})
+
+    # In memory SQLite databases live in their one connection, so are not pooled
+    if url in ("sqlite://", "sqlite:///") or ":memory:" in url:
+        return
+
+    options.setdefault("pool_size", config["DATABASE_POOL_SIZE"])
+    options.setdefault("max_overflow", config["DATABASE_MAX_OVERFLOW"])
+    options.setdefault("pool_timeout", config["DATABASE_POOL_TIMEOUT"])
+    options.setdefault("pool_recycle", config["DATABASE_POOL_RECYCLE"])
+    options.setdefault("pool_pre_ping", config["DATABASE_PRE_PING"])
+
+    if url.startswith("sqlite"):
+        # SQLAlchemy doesn't pool SQLite files by default, but reusing connections
+        # saves opening the file and applying the pragmas on every request
+        options.setdefault("poolclass", QueuePool)
+        # Pooled connections are handed between threads, one at a time
+        connect_args.setdefault("check_same_thread", False)
+        # The timeout argument sets SQLite's busy_timeout
+        connect_args.setdefault("timeout", config["SQLITE_BUSY_TIMEOUT"] / 1000)
+        sqlite_pragmas["journal_mode"] = config["SQLITE_JOURNAL_MODE"]
+        sqlite_pragmas["synchronous"] = config["SQLITE_SYNCHRONOUS"]
+        if not sqlalchemy_event.contains(Pool, "connect", set_sqlite_pragmas):
+            sqlalchemy_event.listen(Pool, "connect", set_sqlite_pragmas)
+
+    elif url.startswith("postgresql"):
+        timeout = config["DATABASE_STATEMENT_TIMEOUT"]
+        connect_args.setdefault("options", f"-c statement_timeout={timeout}")
+
+
+def read_replica(view):
+    """
+    Sends the queries of a read only view to the read replica, if one is configured.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_replica = True
+        return view(*args, **kwargs)
+
+    return wrapper
+
+
+class RoutingSession(SignallingSession):
+    """
+    A session that sends the queries of read only views to the read replica.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if (
+            has_request_context()
+            and g.get("read_replica")
+            and not self._flushing
+            and REPLICA in (self.app.config.get("SQLALCHEMY_BINDS") or {})
+        ):
+            return get_state(self.app).db.get_engine(self.app, bind=REPLICA)
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    """
+    Flask-SQLAlchemy with sessions that can route reads to a read replica.
+    """
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
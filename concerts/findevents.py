@@ -1,38 +1,57 @@
-from datetime import datetime
 from flask import Blueprint, render_template, redirect, url_for, flash, request, abort
+from flask import current_app, jsonify
+from markupsafe import Markup, escape
 from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
 
+from .cache import EVENTS_VERSION, FRAGMENT_CACHE, cached_listing, get_cache
+from .booking import NOT_ENOUGH_TICKETS, INVALID_TICKETS, EVENT_NOT_FOUND, BUSY
+from .database import read_replica
 from .forms import BookingForm, FilterForm, CommentForm
-from .models import Event, Comment, Booking
+from .models import Event, Comment, QueueEntry
+from .pagination import paginate
+from .responses import stream_template
+from .search import SEARCH_FIELDS, search_events
+from .waitingroom import enqueue, advance, is_admitted, position, process
+from .waitingroom import INTERRUPTED, PROCESSING
 from . import db
 
 bp = Blueprint("findevents", __name__, url_prefix="/findevents")
 
+EVENTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 20
+
+# Stands in for the link of a cached event card, which differs between pages
+CARD_LINK = "__card_link__"
+
+# URL parameters that select what the findevents page shows
+LISTING_ARGS = SEARCH_FIELDS + ["aftertimestamp", "beforetimestamp", "status", "cursor"]
+
 
 @bp.route("/", methods=["GET", "POST"])
+@read_replica
+@cached_listing(EVENTS_VERSION, LISTING_ARGS)
 def show():
     """
     Renders the findevents page.
-    Will use URL parameters to filter events.
+    Will use URL parameters to filter events, and the cursor parameter to select a page.
     """
     error = None
-    query = Event.query
+    query = Event.query.filter(Event.deleted_at.is_(None))
     specified_after_date = False
 
-    # URL parameter filters, ignore the "submit" key in arguments
-    for key in request.args.keys():
-        if request.args[key] != "" and request.args[key] != "submit":
-            if key == "title":
-                title = "%" + request.args["title"] + "%"
-                query = query.filter(Event.title.ilike(title))
-
-            if key == "artist":
-                artist = "%" + request.args["artist"] + "%"
-                query = query.filter(Event.artist.ilike(artist))
+    # Title, artist and genre filters use the full text search index
+    search = {}
 
-            if key == "genre":
-                genre = "%" + request.args["genre"] + "%"
-                query = query.filter(Event.genre.ilike(genre))
+    # URL parameter filters, ignore the "submit" and "cursor" keys in arguments
+    for key in request.args.keys():
+        if (
+            request.args[key] != ""
+            and request.args[key] != "submit"
+            and key != "cursor"
+        ):
+            if key in SEARCH_FIELDS:
+                search[key] = request.args[key]
 
             if key == "aftertimestamp":
                 aftertimestamp = request.args["aftertimestamp"]
@@ -43,74 +62,88 @@ def show():
                 beforetimestamp = request.args["beforetimestamp"]
                 query = query.filter(Event.timestamp <= beforetimestamp)
 
-            # If a the status is booked or upcoming, check the number of available tickets
+            # An upcoming event with no tickets left has the booked status
             if key == "status":
-                status = request.args["status"]
-                if status == "booked":
-                    query = query.filter(Event.status.like("upcoming"))
-                    query = query.filter(Event.tickets == 0)
-                elif status == "upcoming":
-                    query = query.filter(Event.status.like("upcoming"))
-                    query = query.filter(Event.tickets != 0)
-                else:
-                    query = query.filter(Event.status.like(status))
+                query = query.filter(Event.status_display == request.args["status"])
 
     # If the timestampafter is left empty, it will only show upcoming events
     # if not specified_after_date:
     #     query = query.filter(Event.timestamp >= datetime.now())
 
-    # Limit search result to 10, and sort by timestamp
-    events = query.order_by(Event.timestamp.asc()).limit(10).all()
+    # Sort by relevance if searching, then by timestamp, and show 10 events per page
+    query, rank = search_events(query, search)
+    keys = [Event.timestamp, Event.id]
+    if rank is not None:
+        keys.insert(0, rank)
+
+    page = paginate(query, keys, request.args.get("cursor"), EVENTS_PER_PAGE)
+    events = page.items
+
+    # Keep the filters when moving between pages
+    page_args = request.args.to_dict()
+    page_args.pop("cursor", None)
 
     # Flash an error if the query returns no results
     if events == []:
         error = "No events found"
-    else:
-        # If the status is upcoming, but there are no tickets available, set the status display to booked
-        for event in events:
-            if event.tickets == 0 and event.status == "upcoming":
-                setattr(event, "status_display", "booked")
-            else:
-                setattr(event, "status_display", event.status)
 
     filterform = FilterForm()
 
     if error is None:
-        return render_template(
+        return stream_template(
             "pages/findevents.jinja",
             events=enumerate(events),
+            page=page,
+            page_args=page_args,
             filterform=filterform,
             request=request,
         )
     else:
         flash(error)
 
-    return render_template(
+    return stream_template(
         "pages/findevents.jinja",
         events=enumerate(events),
+        page=page,
+        page_args=page_args,
         filterform=filterform,
         request=request,
     )
 
 
+@bp.app_template_global()
+def event_card(event):
+    """
+    Returns the rendered card of an event, from the fragment cache if it is unchanged.
+    """
+    cache = get_cache(FRAGMENT_CACHE)
+    key = f"card:{event.id}:{event.version}"
+
+    html = cache and cache.get(key)
+    if html is None:
+        html = render_template(
+            "components/cardcontent.jinja", event=event, link=CARD_LINK
+        ).encode()
+        if cache is not None:
+            cache.set(key, html)
+
+    # The link returns to the current page
+    link = escape(url_for("findevents.details", id=event.id, next=request.url))
+    return Markup(html.decode().replace(CARD_LINK, link))
+
+
 @bp.route("/<id>", methods=["GET", "POST"])
 def details(id):
     """
     Renders the eventdetails page.
     """
     error = None
-    event = Event.query.get(id)
+    event = Event.query.options(joinedload(Event.images)).get(id)
 
-    # If event cannot be found by the id, return 404 not found
-    if event == None:
+    # If event cannot be found by the id, or is deleted, return 404 not found
+    if event == None or event.deleted_at is not None:
         abort(404)
     else:
-        # If the status is upcoming, but there are no tickets available, set the status display to booked
-        if event.tickets == 0 and event.status == "upcoming":
-            setattr(event, "status_display", "booked")
-        else:
-            setattr(event, "status_display", event.status)
-
         commentform = CommentForm()
         bookingform = BookingForm()
 
@@ -119,7 +152,14 @@ def details(id):
             return redirect(url_for("findevents.details", id=id))
 
         if bookingform.validate_on_submit():
-            add_booking(bookingform)
+            # The booking modal is shown to everyone, but only users can book
+            if not current_user.is_authenticated:
+                return current_app.login_manager.unauthorized()
+
+            # If the booking has to wait its turn, send the user to the waiting room
+            entry = add_booking(bookingform)
+            if entry is not None:
+                return redirect(url_for("findevents.queue", id=id, token=entry.token))
             return redirect(url_for("findevents.details", id=id))
 
     if error:
@@ -128,11 +168,43 @@ def details(id):
     return render_template(
         "pages/eventdetails.jinja",
         event=event,
+        comments=comments_page(event.id),
         commentform=commentform,
         bookingform=bookingform,
     )
 
 
+@bp.route("/<id>/comments")
+@read_replica
+def comments(id):
+    """
+    Renders a page of an event's comments, fetched by main.js to load more comments.
+    Will use the cursor URL parameter to select the page.
+    """
+    # Comments of an event that doesn't exist, or is deleted, are not found either
+    exists = (
+        db.session.query(Event.id)
+        .filter(Event.id == id, Event.deleted_at.is_(None))
+        .scalar()
+    )
+    if exists is None:
+        abort(404)
+
+    return render_template(
+        "components/comments.jinja",
+        event_id=id,
+        comments=comments_page(id, request.args.get("cursor")),
+    )
+
+
+def comments_page(event_id, cursor=None):
+    """
+    Returns a page of an event's comments, oldest first.
+    """
+    query = Comment.query.filter(Comment.event_id == event_id)
+    return paginate(query, [Comment.timestamp, Comment.id], cursor, COMMENTS_PER_PAGE)
+
+
 @login_required
 def add_comment(commentform):
     """
@@ -151,29 +223,106 @@ def add_comment(commentform):
     db.session.commit()
 
 
+@bp.route("/<id>/queue/<token>")
+@login_required
+def queue(id, token):
+    """
+    Renders the waitingroom page for a booking waiting in an event's queue.
+    Requires the user to be logged in.
+    """
+    entry = QueueEntry.query.filter_by(
+        token=token, user_id=current_user.id
+    ).first_or_404()
+    event = Event.query.get_or_404(entry.event_id)
+
+    return render_template(
+        "pages/waitingroom.jinja",
+        event=event,
+        entry=entry,
+        position=position(entry),
+    )
+
+
+@bp.route("/<id>/queue/<token>/status")
+@login_required
+def queue_status(id, token):
+    """
+    Returns the queue position of a waiting booking as JSON, polled by the waitingroom page.
+    Makes the booking once the entry is admitted.
+    Responds with 410 gone if the event was deleted while the booking waited.
+    Requires the user to be logged in.
+    """
+    entry = QueueEntry.query.filter_by(token=token, user_id=current_user.id).first()
+
+    # A deleted event's queue is purged along with it, so the entry may be gone too
+    if entry is None or not (
+        db.session.query(Event.id)
+        .filter(Event.id == entry.event_id, Event.deleted_at.is_(None))
+        .scalar()
+    ):
+        flash("Booking cancelled: The event is no longer available")
+        return jsonify(done=True, redirect=url_for("findevents.show")), 410
+
+    advance(entry.event_id)
+
+    # Also checks on an entry being processed, in case its worker died midway
+    if entry.result in (None, PROCESSING) and is_admitted(entry):
+        flash_booking_result(process(entry))
+
+    # The booking is done, unless another request is still making it
+    if entry.result is not None and entry.result != PROCESSING:
+        return jsonify(
+            done=True,
+            redirect=url_for("findevents.details", id=entry.event_id),
+        )
+
+    # Poll again roughly when the entry is expected to be admitted
+    ahead = position(entry)
+    rate = current_app.config["WAITING_ROOM_RATE"]
+    return jsonify(
+        done=False,
+        position=ahead,
+        retry_after=min(10, max(1, ahead / rate)),
+    )
+
+
 @login_required
 def add_booking(bookingform):
     """
-    Adds a booking to the database.
+    Adds a booking to the event's queue, and makes the booking if it is admitted straight away.
+    Returns the queue entry if the booking has to wait, else None.
     Requires the user to be logged in.
     """
     tickets = bookingform.tickets.data
-    price = bookingform.price.data
     event_id = bookingform.event_id.data
-    event = Event.query.get(event_id)
 
-    # If the number of tickets booked exceeds the remaining number of tickets, flash an error
-    # Else remove the tickets from event tickets, create a booking object, and commit add it to the database
-    if tickets > event.tickets:
-        error = "Booking denied: Exceeded number of tickets available"
-        flash(error)
-    else:
-        booking = Booking(
-            tickets=tickets,
-            price=price,
-            event_id=event_id,
-            user_id=current_user.id,
-        )
-        event.tickets = event.tickets - tickets
-        db.session.add(booking)
-        db.session.commit()
+    if tickets is None or tickets < 1:
+        flash_booking_result(INVALID_TICKETS)
+        return None
+
+    # Bookings are admitted at a bounded rate, so a rush of buyers can't flood the database
+    entry = enqueue(event_id, current_user.id, tickets)
+    advance(event_id)
+
+    if not is_admitted(entry):
+        return entry
+
+    # Tickets are taken atomically, so concurrent bookings can't oversell the event
+    flash_booking_result(process(entry))
+    return None
+
+
+def flash_booking_result(result):
+    """
+    Flashes the reason a booking was not made.
+    """
+    if result == NOT_ENOUGH_TICKETS:
+        flash("Booking denied: Exceeded number of tickets available")
+    elif result == INVALID_TICKETS:
+        flash("Booking denied: Enter a valid number of tickets")
+    elif result == EVENT_NOT_FOUND:
+        flash("Booking denied: Event not found")
+    elif result == BUSY:
+        flash("Booking failed: Too many bookings at once, please try again")
+    elif result == INTERRUPTED:
+        flash("Booking interrupted: Check your booked events before trying again")
@@ -3,9 +3,14 @@ from flask_wtf.file import FileAllowed, FileRequired, FileField
 from wtforms.fields import TextAreaField, SubmitField, StringField, PasswordField
 from wtforms.fields import FloatField, IntegerField, SelectField, HiddenField
 from wtforms.validators import InputRequired, Email, EqualTo, NumberRange
+from wtforms.validators import StopValidation
 from wtforms.fields.html5 import DateTimeField
+from werkzeug.datastructures import FileStorage
+
+from .images import check_upload
 
 IMAGE_FILE_FORMATS = {"jpg", "png", "jpeg"}
+IMPORT_FILE_FORMATS = {"csv", "json", "jsonl", "xlsx"}
 EVENT_STATUS = [
     "upcoming",
     "inactive",
@@ -13,6 +18,18 @@ EVENT_STATUS = [
 ]
 
 
+class ImageContent:
+    """
+    Validates that an uploaded file is an image by its contents, not just its name.
+    """
+
+    def __call__(self, form, field):
+        if isinstance(field.data, FileStorage) and field.data:
+            error = check_upload(field.data.stream)
+            if error:
+                raise StopValidation(error)
+
+
 class LoginForm(FlaskForm):
     email = StringField("Email", validators=[Email("Enter a valid email")])
     password = PasswordField("Password", validators=[InputRequired("Enter a password")])
@@ -66,6 +83,7 @@ class EventForm(FlaskForm):
         "Image",
         validators=[
             FileAllowed(IMAGE_FILE_FORMATS, message="Images only!"),
+            ImageContent(),
         ],
     )
     tickets = IntegerField(
@@ -80,6 +98,17 @@ class EventForm(FlaskForm):
     event_id = HiddenField("Event ID")
 
 
+class ImportForm(FlaskForm):
+    file = FileField(
+        "Events file (CSV, JSON or XLSX)",
+        validators=[
+            FileRequired("Choose a file to import"),
+            FileAllowed(IMPORT_FILE_FORMATS, message="CSV, JSON or XLSX files only!"),
+        ],
+    )
+    submit = SubmitField("Import events")
+
+
 class CommentForm(FlaskForm):
     desc = TextAreaField(
         "Write a comment", validators=[InputRequired("Write a comment")]
@@ -0,0 +1,294 @@
+from hashlib import sha256
+from io import BytesIO
+import os
+from tempfile import SpooledTemporaryFile
+import click
+from flask import Blueprint, Request, abort, current_app, make_response, request
+from flask import url_for
+from PIL import Image, ImageOps, features
+
+from .assets import static_url
+from .cache import EVENTS_VERSION, bump_version
+from .config import set_defaults
+from .models import Event, EventImage
+from . import db
+
+bp = Blueprint("images", __name__, url_prefix="/images")
+
+# Images are addressed by the hash of their contents, so a URL never changes meaning
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_IMAGE = "images/image-regular.png"
+
+# Leading bytes of each supported image format
+IMAGE_SIGNATURES = [
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+]
+
+# Formats accepted for upload, by their sniffed mimetype
+UPLOAD_MIMETYPES = {"image/jpeg", "image/png"}
+
+# Upload limits, which the app config can override
+UPLOAD_DEFAULTS = {
+    # Bytes of a whole request, larger requests are refused with 413
+    "MAX_CONTENT_LENGTH": int(os.getenv("MAX_CONTENT_LENGTH", 16 * 1024 * 1024)),
+    # Bytes of an upload held in memory before it is spooled to a temporary file
+    "UPLOAD_SPOOL_SIZE": 512 * 1024,
+    # Pixels of an uploaded image, larger images are too slow to decode
+    "MAX_IMAGE_PIXELS": 40_000_000,
+}
+
+# Bytes of an upload read at a time while it is hashed
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+# Bounding box of each variant, the card thumbnail is sized for a 2x display
+IMAGE_VARIANTS = {
+    "card": (640, 480),
+    "hero": (1600, 900),
+}
+
+# Pillow save options for each variant encoding
+IMAGE_ENCODINGS = {
+    "image/webp": ("WEBP", {"quality": 75, "method": 4}),
+    "image/jpeg": ("JPEG", {"quality": 80, "optimize": True, "progressive": True}),
+}
+
+
+class UploadRequest(Request):
+    """
+    A request that spools uploaded files to disk past the configured size.
+    """
+
+    def _get_file_stream(
+        self, total_content_length, content_type, filename=None, content_length=None
+    ):
+        max_size = current_app.config["UPLOAD_SPOOL_SIZE"]
+        return SpooledTemporaryFile(max_size=max_size, mode="rb+")
+
+
+def init_app(app):
+    """
+    Sets the upload limits and spools uploads with the app's requests.
+    """
+    set_defaults(app, UPLOAD_DEFAULTS)
+    app.request_class = UploadRequest
+
+
+def image_digest(image_data):
+    """
+    Returns the content hash used to address an image.
+    """
+    return sha256(image_data).hexdigest()
+
+
+def image_mimetype(image_data):
+    """
+    Returns the mimetype of an image by sniffing its leading bytes.
+    """
+    for signature, mimetype in IMAGE_SIGNATURES:
+        if image_data.startswith(signature):
+            return mimetype
+
+    if image_data[:4] == b"RIFF" and image_data[8:12] == b"WEBP":
+        return "image/webp"
+
+    return "application/octet-stream"
+
+
+def read_upload(file):
+    """
+    Returns the content hash and sniffed mimetype of an uploaded file, reading it
+    in chunks so that it is never held in memory whole.
+    The file is left at its start, to be read again.
+    """
+    digest = sha256()
+    file.seek(0)
+    chunk = file.read(UPLOAD_CHUNK_SIZE)
+    mimetype = image_mimetype(chunk)
+    while chunk:
+        digest.update(chunk)
+        chunk = file.read(UPLOAD_CHUNK_SIZE)
+    file.seek(0)
+    return digest.hexdigest(), mimetype
+
+
+def check_upload(file):
+    """
+    Returns an error message if an uploaded file is not an image that can be stored,
+    judging by its contents rather than its name, or None if it can be.
+    Only the image header is decoded.
+    """
+    file.seek(0)
+    mimetype = image_mimetype(file.read(16))
+    file.seek(0)
+    if mimetype not in UPLOAD_MIMETYPES:
+        return "Images only!"
+
+    try:
+        with Image.open(file) as image:
+            width, height = image.size
+    except (OSError, Image.DecompressionBombError):
+        return "The image could not be read"
+    finally:
+        file.seek(0)
+
+    if width * height > current_app.config["MAX_IMAGE_PIXELS"]:
+        return "The image has too many pixels"
+
+    return None
+
+
+def make_original(file):
+    """
+    Returns the uploaded image as stored, to be served to clients that need full size.
+    """
+    digest, mimetype = read_upload(file)
+    with Image.open(file) as original:
+        width, height = original.size
+
+    # The blob is read only once the upload has been hashed
+    file.seek(0)
+    return EventImage(
+        kind="original",
+        mimetype=mimetype,
+        width=width,
+        height=height,
+        digest=digest,
+        data=file.read(),
+    )
+
+
+def make_variants(file):
+    """
+    Returns the resized and re-encoded variants of an uploaded image file.
+    WebP variants are only produced if Pillow was built with WebP support.
+    """
+    variants = []
+    encodings = [
+        mimetype
+        for mimetype in IMAGE_ENCODINGS
+        if mimetype != "image/webp" or features.check("webp")
+    ]
+
+    file.seek(0)
+    with Image.open(file) as original:
+        # Apply the camera orientation before EXIF data is dropped by re-encoding
+        image = ImageOps.exif_transpose(original).convert("RGB")
+
+    for kind, size in IMAGE_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail(size, Image.LANCZOS)
+
+        for mimetype in encodings:
+            format, options = IMAGE_ENCODINGS[mimetype]
+            buffer = BytesIO()
+            resized.save(buffer, format, **options)
+            data = buffer.getvalue()
+
+            variants.append(
+                EventImage(
+                    kind=kind,
+                    mimetype=mimetype,
+                    width=resized.width,
+                    height=resized.height,
+                    digest=image_digest(data),
+                    data=data,
+                )
+            )
+
+    return variants
+
+
+def make_images(file):
+    """
+    Returns the original and all variants of an uploaded image file.
+    """
+    return [make_original(file)] + make_variants(file)
+
+
+@bp.app_template_global()
+def event_image_url(event):
+    """
+    Returns the URL of an event's original image, or the default image if it has none.
+    """
+    for image in event.images:
+        if image.kind == "original":
+            return url_for("images.show", digest=image.digest)
+
+    return static_url(DEFAULT_IMAGE)
+
+
+@bp.app_template_global()
+def event_image_sources(event, kind):
+    """
+    Returns the URLs of an event's image variants of a kind, keyed by mimetype.
+    Falls back to the original image if the event has no variants of that kind.
+    """
+    sources = {
+        image.mimetype: url_for("images.show", digest=image.digest)
+        for image in event.images
+        if image.kind == kind
+    }
+
+    if "image/jpeg" not in sources:
+        sources["image/jpeg"] = event_image_url(event)
+
+    return sources
+
+
+@bp.route("/<digest>")
+def show(digest):
+    """
+    Serves an image or image variant by its content hash.
+    Responds with 304 not modified if the client already holds the image.
+    """
+    # The digest is a strong ETag, so a matching client copy is always current
+    if digest in request.if_none_match:
+        response = make_response("", 304)
+    else:
+        # The blob is a deferred column, so it is only ever loaded here
+        image = (
+            db.session.query(EventImage.data, EventImage.mimetype)
+            .filter(EventImage.digest == digest)
+            .first()
+        )
+
+        # If no event holds an image with this hash, return 404 not found
+        if image is None:
+            abort(404)
+
+        image_data, mimetype = image
+        response = make_response(image_data)
+        response.mimetype = mimetype
+
+    response.set_etag(digest)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return response
+
+
+@bp.cli.command("rebuild")
+@click.option(
+    "--all", "rebuild_all", is_flag=True, help="Also rebuild existing variants."
+)
+def rebuild(rebuild_all):
+    """
+    Generates image variants for events that have an original image but no variants.
+    """
+    query = EventImage.query.filter(EventImage.kind == "original")
+    if not rebuild_all:
+        query = query.filter(
+            ~EventImage.event.has(Event.images.any(EventImage.kind != "original"))
+        )
+
+    count = 0
+    for original in query.all():
+        event = original.event
+        event.images = [original] + make_variants(BytesIO(original.data))
+        event.version = Event.version + 1
+        db.session.commit()
+        count += 1
+
+    # The listings link to the rebuilt variants
+    bump_version(EVENTS_VERSION)
+    click.echo(f"Rebuilt image variants for {count} events")
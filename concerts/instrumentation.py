@@ -0,0 +1,340 @@
+from collections import deque
+from threading import Lock
+from time import perf_counter
+import hmac
+import sqlite3
+from flask import Blueprint, Response, abort, current_app, g, has_request_context
+from flask import request
+from sqlalchemy import event as sqlalchemy_event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from .config import set_defaults
+from .database import REPLICA
+from . import db
+
+bp = Blueprint("instrumentation", __name__, url_prefix="/admin")
+
+INSTRUMENTATION_DEFAULTS = {
+    # Request durations kept per endpoint to estimate percentiles from
+    "METRICS_SAMPLES": 1000,
+    # Bearer token of the metrics endpoint, which is not found without one
+    "METRICS_TOKEN": None,
+    # Queries slower than this many seconds are logged with their plan
+    "SLOW_QUERY_SECONDS": 0.1,
+    "QUERY_COUNT_HEADER": False,
+}
+
+QUANTILES = [0.5, 0.95, 0.99]
+
+# Totals summed per endpoint, with the help text of their metrics
+TOTALS = {
+    "requests": "Requests served.",
+    "queries": "SQL queries issued.",
+    "sql_seconds": "Seconds spent executing SQL queries.",
+    "rows": "Rows fetched from the database.",
+    "bytes": "Approximate bytes of column values fetched from the database.",
+}
+
+
+# Gauges of the database connection pools, named after the QueuePool methods
+POOL_GAUGES = {
+    "size": "Connections the pool keeps open.",
+    "connections_checkedout": "Connections in use by requests.",
+    "connections_checkedin": "Idle connections in the pool.",
+    "overflow": "Connections open beyond the pool size, negative if below it.",
+}
+
+
+class EndpointStats:
+    """
+    Totals and recent samples of the requests to one endpoint.
+    """
+
+    def __init__(self, samples):
+        self.totals = dict.fromkeys(TOTALS, 0)
+        self.durations = deque(maxlen=samples)
+        self.sql_durations = deque(maxlen=samples)
+        self.duration_sum = 0.0
+
+
+stats = {}
+stats_lock = Lock()
+
+
+def request_sql():
+    """
+    Returns the SQL totals of the current request, or None outside of a request.
+    """
+    if not has_request_context():
+        return None
+    if "sql" not in g:
+        g.sql = {"queries": 0, "sql_seconds": 0.0, "rows": 0, "bytes": 0}
+    return g.sql
+
+
+def before_cursor_execute(connection, cursor, statement, parameters, context, many):
+    context._query_start = perf_counter()
+
+
+def after_cursor_execute(connection, cursor, statement, parameters, context, many):
+    sql = request_sql()
+    if sql is None or g.get("explaining"):
+        return
+
+    seconds = perf_counter() - context._query_start
+    sql["queries"] += 1
+    sql["sql_seconds"] += seconds
+
+    # Slow queries are explained after the request, outside of its transaction
+    threshold = current_app.config["SLOW_QUERY_SECONDS"]
+    if seconds > threshold:
+        g.setdefault("slow_queries", []).append((statement, parameters, seconds))
+
+
+def value_size(value):
+    """
+    Returns the approximate size in bytes of a fetched value.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, (str, bytes, bytearray, memoryview)):
+        return len(value)
+    return 8
+
+
+def count_rows(rows):
+    """
+    Counts rows fetched by the current request, and the size of their values.
+    """
+    sql = request_sql()
+    if sql is None or g.get("explaining"):
+        return
+
+    for row in rows:
+        sql["rows"] += 1
+        sql["bytes"] += sum(value_size(value) for value in row)
+
+
+def count_row(cursor, row):
+    """
+    Row factory of SQLite connections, which counts each row as it is fetched.
+    """
+    count_rows((row,))
+    return row
+
+
+counting_cursors = {}
+
+
+def counting_cursor(base):
+    """
+    Returns a subclass of a DBAPI cursor class that counts the rows it fetches.
+    """
+    if base not in counting_cursors:
+
+        class CountingCursor(base):
+            def fetchone(self):
+                row = super().fetchone()
+                if row is not None:
+                    count_rows((row,))
+                return row
+
+            def fetchmany(self, *args, **kwargs):
+                rows = super().fetchmany(*args, **kwargs)
+                count_rows(rows)
+                return rows
+
+            def fetchall(self):
+                rows = super().fetchall()
+                count_rows(rows)
+                return rows
+
+        counting_cursors[base] = CountingCursor
+
+    return counting_cursors[base]
+
+
+def instrument_connection(dbapi_connection, connection_record):
+    """
+    Makes a new database connection count the rows fetched through it.
+    """
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        dbapi_connection.row_factory = count_row
+    elif hasattr(dbapi_connection, "cursor_factory"):
+        # e.g. psycopg2, whose connections create cursors of a configurable class
+        base = dbapi_connection.cursor_factory or type(dbapi_connection.cursor())
+        dbapi_connection.cursor_factory = counting_cursor(base)
+
+
+def explain_slow_queries(app, endpoint, slow_queries):
+    """
+    Logs slow queries of a request together with their query plans.
+    Called once the response has been sent, in an app context of its own.
+    """
+    from .queryplans import explain
+
+    with app.app_context():
+        g.explaining = True
+        with db.engine.connect() as connection:
+            for statement, parameters, seconds in slow_queries:
+                try:
+                    plan = explain(connection, statement, parameters, False)
+                except Exception as error:
+                    plan = ["Could not explain query: " + str(error)]
+                app.logger.warning(
+                    "Slow query in %s took %.1fms:\n  %s\n  %r\n%s",
+                    endpoint,
+                    seconds * 1000,
+                    " ".join(statement.split()),
+                    parameters,
+                    "\n".join("    " + line for line in plan),
+                )
+
+
+def percentile(samples, quantile):
+    """
+    Returns a quantile of samples using the nearest rank.
+    """
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(quantile * len(samples)))]
+
+
+def init_app(app):
+    """
+    Records the duration and SQL cost of each request per endpoint, and logs slow
+    queries with their plans. Totals are served by the metrics endpoint.
+    The query count is sent in the X-Query-Count header if QUERY_COUNT_HEADER is set.
+    """
+    set_defaults(app, INSTRUMENTATION_DEFAULTS)
+
+    listeners = [
+        (Engine, "before_cursor_execute", before_cursor_execute),
+        (Engine, "after_cursor_execute", after_cursor_execute),
+        (Pool, "connect", instrument_connection),
+    ]
+    for target, name, listener in listeners:
+        if not sqlalchemy_event.contains(target, name, listener):
+            sqlalchemy_event.listen(target, name, listener)
+
+    @app.before_request
+    def start_request():
+        g.request_start = perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        seconds = perf_counter() - g.get("request_start", perf_counter())
+        sql = request_sql()
+        endpoint = request.endpoint or "unmatched"
+
+        with stats_lock:
+            endpoint_stats = stats.get(endpoint)
+            if endpoint_stats is None:
+                samples = app.config["METRICS_SAMPLES"]
+                endpoint_stats = stats[endpoint] = EndpointStats(samples)
+            endpoint_stats.totals["requests"] += 1
+            for key, value in sql.items():
+                endpoint_stats.totals[key] += value
+            endpoint_stats.durations.append(seconds)
+            endpoint_stats.sql_durations.append(sql["sql_seconds"])
+            endpoint_stats.duration_sum += seconds
+
+        # Explaining costs more queries, so it waits until the response has been sent
+        if "slow_queries" in g:
+            slow_queries = g.pop("slow_queries")
+            response.call_on_close(
+                lambda: explain_slow_queries(app, endpoint, slow_queries)
+            )
+
+        if app.config["QUERY_COUNT_HEADER"]:
+            response.headers["X-Query-Count"] = str(sql["queries"])
+        return response
+
+
+def render_metrics():
+    """
+    Returns the metrics of this worker process in the Prometheus text format.
+    """
+    lines = []
+
+    with stats_lock:
+        endpoints = sorted(stats.items())
+
+        for name, metric in [
+            ("request_duration_seconds", "durations"),
+            ("request_sql_seconds", "sql_durations"),
+        ]:
+            lines.append(f"# TYPE concerts_{name} summary")
+            for endpoint, endpoint_stats in endpoints:
+                samples = getattr(endpoint_stats, metric)
+                for quantile in QUANTILES:
+                    value = percentile(samples, quantile)
+                    lines.append(
+                        f'concerts_{name}{{endpoint="{endpoint}",'
+                        f'quantile="{quantile}"}} {value:.6f}'
+                    )
+            if name == "request_duration_seconds":
+                for endpoint, endpoint_stats in endpoints:
+                    lines.append(
+                        f'concerts_{name}_sum{{endpoint="{endpoint}"}} '
+                        f"{endpoint_stats.duration_sum:.6f}"
+                    )
+                    lines.append(
+                        f'concerts_{name}_count{{endpoint="{endpoint}"}} '
+                        f'{endpoint_stats.totals["requests"]}'
+                    )
+
+        for key, help in TOTALS.items():
+            lines.append(f"# HELP concerts_{key}_total {help}")
+            lines.append(f"# TYPE concerts_{key}_total counter")
+            for endpoint, endpoint_stats in endpoints:
+                lines.append(
+                    f'concerts_{key}_total{{endpoint="{endpoint}"}} '
+                    f"{endpoint_stats.totals[key]:g}"
+                )
+
+    # Connections of each engine's pool, if it is a pool that keeps connections
+    engines = [("primary", db.engine)]
+    if REPLICA in (current_app.config.get("SQLALCHEMY_BINDS") or {}):
+        engines.append((REPLICA, db.get_engine(current_app, bind=REPLICA)))
+
+    for name, help in POOL_GAUGES.items():
+        lines.append(f"# HELP concerts_db_pool_{name} {help}")
+        lines.append(f"# TYPE concerts_db_pool_{name} gauge")
+        for engine_name, engine in engines:
+            method = getattr(engine.pool, name.replace("connections_", ""), None)
+            if method is not None:
+                lines.append(
+                    f'concerts_db_pool_{name}{{engine="{engine_name}"}} {method()}'
+                )
+
+    # Hits and misses of the caches
+    for key in ("hits", "misses"):
+        lines.append(f"# TYPE concerts_cache_{key}_total counter")
+        for name, cache in sorted(current_app.extensions.items()):
+            if name.endswith("_cache") and cache is not None:
+                lines.append(
+                    f'concerts_cache_{key}_total{{cache="{name}"}} '
+                    f"{getattr(cache, key)}"
+                )
+
+    return "\n".join(lines) + "\n"
+
+
+@bp.route("/metrics")
+def metrics():
+    """
+    Serves the request and cache metrics of this worker in the Prometheus text format.
+    Requires the METRICS_TOKEN config as a bearer token, and is not found without it.
+    """
+    token = current_app.config["METRICS_TOKEN"]
+    if not token:
+        abort(404)
+
+    supplied = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(supplied.encode(), ("Bearer " + token).encode()):
+        abort(401)
+
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
@@ -1,21 +1,34 @@
 from datetime import datetime
 from flask_login import UserMixin
+from sqlalchemy import and_, case, literal_column
+from sqlalchemy.ext.hybrid import hybrid_property
 import os
 
+from .database import REPLICA, configure_engine, database_url
 from . import db
 
 
 def setup_db(app):
     database_path = os.getenv("DATABASE_URL")
 
-    if database_path is None:
+    if app.config.get("SQLALCHEMY_DATABASE_URI"):
+        print("Using configured database")
+    elif database_path is None:
         app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///testdb.sqlite"
         print("Using test database")
     else:
-        app.config["SQLALCHEMY_DATABASE_URI"] = database_path.replace("://", "ql://", 1)
+        app.config["SQLALCHEMY_DATABASE_URI"] = database_url(database_path)
         print("Using DATABASE_URL")
 
+    # Reads of the listing pages can go to a replica of the database
+    replica_path = os.getenv("DATABASE_REPLICA_URL")
+    if replica_path is not None:
+        binds = app.config.setdefault("SQLALCHEMY_BINDS", {})
+        binds.setdefault(REPLICA, database_url(replica_path))
+        print("Using DATABASE_REPLICA_URL for reads")
+
     print(app.config["SQLALCHEMY_DATABASE_URI"])
+    configure_engine(app)
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     db.app = app
     db.init_app(app)
@@ -28,6 +41,10 @@ def db_drop_and_create_all():
 
 class Event(db.Model):
     __tablename__ = "events"
+    __table_args__ = (
+        # Backs keyset pagination of the event listing
+        db.Index("ix_events_timestamp_id", "timestamp", "id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime)
     title = db.Column(db.String(255))
@@ -39,16 +56,75 @@ class Event(db.Model):
     desc = db.Column(db.Text)
     tickets = db.Column(db.Integer)
     price = db.Column(db.Float)
-    image_data = db.Column(db.LargeBinary)
-    image_render = db.Column(db.Text)
 
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    # Bumped by every change to what the event's card shows, to key cached cards
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+
+    # Set when the event is deleted, which hides it at once until it is purged
+    deleted_at = db.Column(db.DateTime, index=True)
+
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), index=True)
 
     comments = db.relationship("Comment", backref="event")
+    bookings = db.relationship("Booking", backref="event")
+    images = db.relationship(
+        "EventImage", backref="event", lazy="selectin", cascade="all, delete-orphan"
+    )
+
+    @hybrid_property
+    def status_display(self):
+        """
+        The status shown to users, an upcoming event with no tickets left is booked.
+        """
+        if self.tickets == 0 and self.status == "upcoming":
+            return "booked"
+        return self.status
+
+    @status_display.expression
+    def status_display(cls):
+        # Constants are inlined rather than bound, so queries match the index below
+        return case(
+            (
+                and_(
+                    cls.tickets == literal_column("0"),
+                    cls.status == literal_column("'upcoming'"),
+                ),
+                literal_column("'booked'"),
+            ),
+            else_=cls.status,
+        )
+
+
+# Backs the status filter of the event listing, in listing order
+db.Index(
+    "ix_events_status_display_timestamp_id",
+    Event.status_display,
+    Event.timestamp,
+    Event.id,
+)
+
+
+class EventImage(db.Model):
+    __tablename__ = "event_images"
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(255), nullable=False)
+    mimetype = db.Column(db.String(255), nullable=False)
+    width = db.Column(db.Integer)
+    height = db.Column(db.Integer)
+    digest = db.Column(db.String(64), index=True, nullable=False)
+
+    # Only loaded when the image itself is served
+    data = db.deferred(db.Column(db.LargeBinary, nullable=False))
+
+    event_id = db.Column(db.Integer, db.ForeignKey("events.id"), index=True)
 
 
 class Comment(db.Model):
     __tablename__ = "comments"
+    __table_args__ = (
+        # Backs keyset pagination of an event's comments
+        db.Index("ix_comments_event_id_timestamp_id", "event_id", "timestamp", "id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.now)
     desc = db.Column(db.Text)
@@ -60,15 +136,78 @@ class Comment(db.Model):
 
 class Booking(db.Model):
     __tablename__ = "bookings"
+    __table_args__ = (
+        # Backs keyset pagination of a user's bookings
+        db.Index("ix_bookings_user_id_timestamp_id", "user_id", "timestamp", "id"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.now)
     tickets = db.Column(db.Integer)
     price = db.Column(db.Float)
 
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
+    event_id = db.Column(db.Integer, db.ForeignKey("events.id"), index=True)
+
+
+class EventSales(db.Model):
+    __tablename__ = "event_sales"
+    # Running totals of an event's bookings, kept up to date by each booking
+    event_id = db.Column(db.Integer, db.ForeignKey("events.id"), primary_key=True)
+    tickets = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+
+    event = db.relationship(
+        "Event",
+        backref=db.backref("sales", uselist=False, cascade="all, delete-orphan"),
+    )
+
+
+class DailySales(db.Model):
+    __tablename__ = "daily_sales"
+    # Running totals of the bookings of an organiser's events on each day
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    tickets = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+
+
+class QueueEntry(db.Model):
+    __tablename__ = "queue_entries"
+    __table_args__ = (
+        # Backs counting the entries ahead of an entry in an event's queue
+        db.Index("ix_queue_entries_event_id_id", "event_id", "id"),
+    )
+    # Entries are admitted in id order
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(255), index=True, unique=True, nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.now)
+    tickets = db.Column(db.Integer)
+    result = db.Column(db.String(255))
+    # When the entry's booking started being made
+    claimed = db.Column(db.Float)
+
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"))
     event_id = db.Column(db.Integer, db.ForeignKey("events.id"))
 
 
+class WaitingRoom(db.Model):
+    __tablename__ = "waiting_rooms"
+    # Token bucket of admissions, and the last queue entry admitted
+    event_id = db.Column(db.Integer, db.ForeignKey("events.id"), primary_key=True)
+    admitted_id = db.Column(db.Integer, nullable=False, default=0)
+    allowance = db.Column(db.Float, nullable=False, default=0)
+    updated = db.Column(db.Float, nullable=False)
+
+
+class CacheVersion(db.Model):
+    __tablename__ = "cache_versions"
+    # Bumped by every write to the cached data, so cache keys of older versions go unused
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
 class User(db.Model, UserMixin):
     __tablename__ = "users"
     id = db.Column(db.Integer, primary_key=True)
@@ -1,41 +1,53 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Response, abort, current_app, stream_with_context
 from werkzeug.utils import secure_filename
 from flask_login import login_required, current_user
 from datetime import datetime
+import click
 import os
-from base64 import b64encode
-import base64
+import sys
 
-from .forms import EventForm
-from .models import Booking, Event
+from .bulk import EXPORT_FORMATS, EXPORTS, export, import_events, read_rows
+from .cache import EVENTS_VERSION, bump_version
+from .forms import EventForm, ImportForm
+from .images import make_images
+from .models import Event, User
+from .pagination import paginate
+from .purge import soft_delete_event, start_purge
+from .responses import stream_template
+from .sales import daily_sales, event_sales, total_sales
 from . import db
 
 bp = Blueprint("myevents", __name__, url_prefix="/myevents")
 
+EVENTS_PER_PAGE = 20
+
 
 @bp.route("/", methods=["GET", "POST"])
 @login_required
 def show():
     """
     Renders the myevents page by querying events with the current user's id.
+    Will use the cursor URL parameter to select a page, ordered like the sales page.
     Requires the user to be logged in.
     """
     error = None
-    events = current_user.events
-    events.sort(key=lambda event: event.id, reverse=True)
-    if events == []:
+    page = paginate(
+        Event.query.filter(
+            Event.user_id == current_user.id, Event.deleted_at.is_(None)
+        ),
+        [Event.timestamp, Event.id],
+        request.args.get("cursor"),
+        EVENTS_PER_PAGE,
+    )
+    events = page.items
+    if events == [] and page.prev_cursor is None:
         error = "No events found"
 
     for event in events:
         # HTML datetime-local input has a different formatting to python
         setattr(event, "timestampformatted", event.timestamp.strftime("%Y-%m-%dT%H:%M"))
 
-        # If the status is upcoming, but there are no tickets available, set the status display to booked
-        if event.tickets == 0 and event.status == "upcoming":
-            setattr(event, "status_display", "booked")
-        else:
-            setattr(event, "status_display", event.status)
-
     eventform = EventForm()
 
     if eventform.validate_on_submit():
@@ -56,13 +68,41 @@ def show():
     if error:
         flash(error)
 
-    return render_template(
+    return stream_template(
         "pages/myevents.jinja",
         events=enumerate(events),
+        page=page,
+        page_args={},
         eventform=eventform,
     )
 
 
+@bp.route("/sales")
+@login_required
+def sales():
+    """
+    Renders the organiser dashboard of the current user's events and their sales.
+    Sales come from rollups kept by each booking, so the page costs the same no
+    matter how many bookings there are.
+    Requires the user to be logged in.
+    """
+    page = paginate(
+        event_sales(current_user.id),
+        [Event.timestamp, Event.id],
+        request.args.get("cursor"),
+        EVENTS_PER_PAGE,
+    )
+
+    return render_template(
+        "pages/sales.jinja",
+        events=page.items,
+        page=page,
+        page_args={},
+        totals=total_sales(current_user.id),
+        days=daily_sales(current_user.id),
+    )
+
+
 @bp.route("/delete/<event_id>", methods=["GET", "POST"])
 @login_required
 def delete(event_id):
@@ -75,11 +115,98 @@ def delete(event_id):
     return redirect(url_for("myevents.show"))
 
 
+@bp.route("/import", methods=["GET", "POST"])
+@login_required
+def import_file():
+    """
+    Imports the events of a CSV, JSON or XLSX file for the current user, and renders
+    the number imported along with the errors of any rows that were skipped.
+    A file that breaks off midway still reports the events imported before it.
+    Requires the user to be logged in.
+    """
+    importform = ImportForm()
+    result = None
+
+    if importform.validate_on_submit():
+        file = importform.file.data
+        try:
+            result = import_events(
+                read_rows(file.stream, file.filename), current_user.id
+            )
+        except ValueError as error:
+            flash(str(error))
+
+    return render_template(
+        "pages/importevents.jinja", importform=importform, result=result
+    )
+
+
+@bp.route("/export/<dataset>.<format>")
+@login_required
+def export_file(dataset, format):
+    """
+    Streams the current user's events or bookings as a CSV or JSON file.
+    Rows are fetched and sent in batches, so large exports use little memory.
+    Requires the user to be logged in.
+    """
+    if dataset not in EXPORTS or format not in EXPORT_FORMATS:
+        abort(404)
+
+    response = Response(
+        stream_with_context(export(dataset, format, current_user.id)),
+        mimetype=EXPORT_FORMATS[format],
+    )
+    response.headers["Content-Disposition"] = f"attachment; filename={dataset}.{format}"
+    return response
+
+
+@bp.cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--email", required=True, help="Email of the organiser of the events.")
+def import_command(path, email):
+    """
+    Imports the events of a CSV, JSON or XLSX file for a user.
+    """
+    user = User.query.filter(User.email == email).first()
+    if user is None:
+        raise click.ClickException(f"No user with the email {email}")
+
+    with open(path, "rb") as file:
+        try:
+            result = import_events(read_rows(file, path), user.id)
+        except ValueError as error:
+            raise click.ClickException(str(error))
+
+    for number, message in result.errors:
+        click.echo(f"Row {number}: {message}", err=True)
+    if result.error_count > len(result.errors):
+        click.echo(f"... and {result.error_count - len(result.errors)} more", err=True)
+    if result.failure:
+        click.echo(f"The rest of the file was not imported: {result.failure}", err=True)
+    click.echo(f"Imported {result.imported} events, skipped {result.skipped} rows")
+
+
+@bp.cli.command("export")
+@click.argument("dataset", type=click.Choice(list(EXPORTS)))
+@click.option("--email", required=True, help="Email of the user to export.")
+@click.option("--format", type=click.Choice(list(EXPORT_FORMATS)), default="csv")
+def export_command(dataset, email, format):
+    """
+    Writes a user's events or bookings to standard output as CSV or JSON.
+    """
+    user = User.query.filter(User.email == email).first()
+    if user is None:
+        raise click.ClickException(f"No user with the email {email}")
+
+    for chunk in export(dataset, format, user.id):
+        sys.stdout.write(chunk)
+
+
 def check_upload_file(eventform):
     """
-    Uploads a file from form to database and return its upload path.
-    If there is no input file and the event already exists, return the existing event's image upload path.
-    If there is no input file and no existing event, return the default image upload path.
+    Reads a file from form and returns its original image and resized variants.
+    If there is no input file and the event already exists, return the existing event's images.
+    If there is no input file and no existing event, return no images.
     """
     file = eventform.image.data
     print("CHECKING UPLOADED FILE")
@@ -87,18 +214,16 @@ def check_upload_file(eventform):
     event_id = eventform.event_id.data
 
     if file:
-        image_data = file.read()
-        image_render = base64.b64encode(image_data).decode("ascii")
-
-        return [image_data, image_render]
+        # The upload is read from its spooled file, never copied whole into memory
+        return make_images(file.stream)
 
     elif event_id:
         event = Event.query.get(event_id)
-        return [event.image_data, event.image_render]
+        return event.images
 
     else:
         flash("No image was found")
-        return ["", ""]
+        return []
 
 
 @login_required
@@ -107,7 +232,7 @@ def add_event(eventform):
     Adds an event to the database.
     Requires the user to be logged in.
     """
-    [image_data, image_render] = check_upload_file(eventform)
+    images = check_upload_file(eventform)
     timestamp = datetime.strptime(eventform.timestamp.data, "%Y-%m-%dT%H:%M")
 
     event = Event(
@@ -121,13 +246,13 @@ def add_event(eventform):
         desc=eventform.desc.data,
         tickets=eventform.tickets.data,
         price=eventform.price.data,
-        image_data=image_data,
-        image_render=image_render,
+        images=images,
         user_id=current_user.id,
     )
 
     db.session.add(event)
     db.session.commit()
+    bump_version(EVENTS_VERSION)
 
 
 @login_required
@@ -138,7 +263,7 @@ def update_event(eventform):
     """
     event = Event.query.get(eventform.event_id.data)
 
-    image = check_upload_file(eventform)
+    images = check_upload_file(eventform)
     timestamp = datetime.strptime(eventform.timestamp.data, "%Y-%m-%dT%H:%M")
 
     event.timestamp = timestamp
@@ -151,21 +276,28 @@ def update_event(eventform):
     event.desc = eventform.desc.data
     event.tickets = eventform.tickets.data
     event.price = eventform.price.data
-    event.image = image
+    event.images = images
     event.user_id = current_user.id
+    event.version = Event.version + 1
 
     db.session.commit()
+    bump_version(EVENTS_VERSION)
 
 
 @login_required
 def delete_event(event_id):
     """
     Delete an event on the database.
+    The event is hidden straight away, and it and its bookings, comments and images
+    are deleted by a background purge.
+    Aborts with 404 not found unless the event is one of the user's, and not deleted.
     Requires the user to be logged in.
     """
     event = Event.query.get(event_id)
-    bookings = Booking.query.filter(Booking.event_id == event_id).all()
-    for booking in bookings:
-        db.session.delete(booking)
-    db.session.delete(event)
-    db.session.commit()
+    if event is None or event.user_id != current_user.id:
+        abort(404)
+
+    # An event deleted before, or by a concurrent request, is not deleted again
+    if not soft_delete_event(event):
+        abort(404)
+    start_purge(current_app._get_current_object())
@@ -0,0 +1,102 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+import binascii
+import json
+from flask import abort
+from sqlalchemy import DateTime, literal, tuple_
+
+
+class Page:
+    """
+    A page of query results, with opaque cursors to the pages either side of it.
+    """
+
+    def __init__(self, items, next_cursor, prev_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+
+def encode_cursor(direction, values, keys):
+    """
+    Encodes a position in a keyset ordering into an opaque URL safe string.
+    """
+    values = [
+        value.isoformat() if isinstance(key.type, DateTime) else value
+        for key, value in zip(keys, values)
+    ]
+    data = json.dumps([direction, values], separators=(",", ":")).encode()
+    return urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, keys):
+    """
+    Decodes a cursor into its direction and key values.
+    Aborts with 400 bad request if the cursor was not produced by encode_cursor.
+    """
+    try:
+        data = urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        direction, values = json.loads(data)
+        if direction not in ("after", "before") or len(values) != len(keys):
+            raise ValueError(cursor)
+        values = [
+            datetime.fromisoformat(value) if isinstance(key.type, DateTime) else value
+            for key, value in zip(keys, values)
+        ]
+    except (binascii.Error, TypeError, ValueError):
+        abort(400)
+
+    return direction, values
+
+
+def paginate(query, keys, cursor=None, per_page=10):
+    """
+    Returns a page of a query using keyset pagination.
+    keys are the ascending sort keys of the query and must end in a unique column,
+    so every page costs one index range scan no matter how deep it is.
+    """
+    direction, values = decode_cursor(cursor, keys) if cursor else ("after", None)
+
+    # Select the key values alongside each row, so cursors can be built from them
+    query = query.add_columns(
+        *[key.label("key_" + str(i)) for i, key in enumerate(keys)]
+    )
+
+    if values is not None:
+        position = tuple_(
+            *[literal(value, key.type) for key, value in zip(keys, values)]
+        )
+        if direction == "after":
+            query = query.filter(tuple_(*keys) > position)
+        else:
+            query = query.filter(tuple_(*keys) < position)
+
+    if direction == "after":
+        query = query.order_by(*keys)
+    else:
+        query = query.order_by(*[key.desc() for key in keys])
+
+    # Fetch one extra row to find out if there are more rows past this page
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    # Paging backwards is always from a later page, and paging forwards from a cursor
+    # is always from an earlier page
+    if direction == "after":
+        has_next = has_more
+        has_prev = values is not None
+    else:
+        rows.reverse()
+        has_next = True
+        has_prev = has_more
+
+    next_cursor = None
+    prev_cursor = None
+    if rows:
+        if has_next:
+            next_cursor = encode_cursor("after", rows[-1][1:], keys)
+        if has_prev:
+            prev_cursor = encode_cursor("before", rows[0][1:], keys)
+
+    return Page([row[0] for row in rows], next_cursor, prev_cursor)
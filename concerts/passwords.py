@@ -0,0 +1,118 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+import os
+from flask import current_app
+from werkzeug.exceptions import ServiceUnavailable
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from .config import set_defaults
+
+# Password hashing settings
+HASHING_DEFAULTS = {
+    # werkzeug hash method, with the number of PBKDF2 iterations. Users whose hash
+    # was made with another method are rehashed when they next log in
+    "PASSWORD_HASH_METHOD": os.getenv("PASSWORD_HASH_METHOD", "pbkdf2:sha256:260000"),
+    "PASSWORD_SALT_LENGTH": 16,
+    # Hashes computed at once by each worker process, and hashes that may wait for
+    # a thread before further logins are turned away
+    "PASSWORD_HASH_THREADS": int(os.getenv("PASSWORD_HASH_THREADS", 2)),
+    "PASSWORD_HASH_QUEUE": int(os.getenv("PASSWORD_HASH_QUEUE", 8)),
+}
+
+# Seconds a client turned away for a full queue is asked to wait
+BUSY_RETRY_AFTER = 1
+
+
+def make_executor(threads):
+    """
+    Returns a pool of OS threads. In gevent workers, threads are patched into
+    greenlets, so gevent's own pool of real threads is used instead.
+    """
+    try:
+        from gevent import monkey
+        from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+    except ImportError:
+        return ThreadPoolExecutor(threads)
+
+    if monkey.is_module_patched("threading"):
+        return GeventThreadPoolExecutor(threads)
+    return ThreadPoolExecutor(threads)
+
+
+class HashingPool:
+    """
+    A bounded pool of threads that hash passwords, with a cap on waiting hashes.
+    PBKDF2 releases the GIL, so hashing doesn't stall the worker's other threads
+    or greenlets, and a burst of logins can only take a fixed share of the CPU.
+    """
+
+    def __init__(self, threads, queue):
+        self.executor = make_executor(threads)
+        self.capacity = threads + queue
+        self.pending = 0
+        self.lock = Lock()
+
+    def run(self, function, *args):
+        """
+        Runs a hashing function in the pool and returns its result.
+        Aborts with 503 service unavailable if the pool's queue is full.
+        """
+        with self.lock:
+            if self.pending >= self.capacity:
+                raise ServiceUnavailable(
+                    "Too many logins at once, please try again shortly",
+                    retry_after=BUSY_RETRY_AFTER,
+                )
+            self.pending += 1
+
+        try:
+            return self.executor.submit(function, *args).result()
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+
+def init_app(app):
+    """
+    Sets the password hashing defaults.
+    The pool itself is started by the first hash, in each worker process.
+    """
+    set_defaults(app, HASHING_DEFAULTS)
+
+
+def get_pool():
+    pool = current_app.extensions.get("passwords")
+    if pool is None:
+        config = current_app.config
+        pool = HashingPool(
+            config["PASSWORD_HASH_THREADS"], config["PASSWORD_HASH_QUEUE"]
+        )
+        pool = current_app.extensions.setdefault("passwords", pool)
+    return pool
+
+
+def hash_password(password):
+    """
+    Returns the hash of a password, made with the configured method.
+    """
+    config = current_app.config
+    return get_pool().run(
+        generate_password_hash,
+        password,
+        config["PASSWORD_HASH_METHOD"],
+        config["PASSWORD_SALT_LENGTH"],
+    )
+
+
+def check_password(hash, password):
+    """
+    Returns true if a password matches its hash.
+    """
+    return get_pool().run(check_password_hash, hash, password)
+
+
+def needs_rehash(hash):
+    """
+    Returns true if a hash was made with another method than the configured one.
+    """
+    return hash.split("$", 1)[0] != current_app.config["PASSWORD_HASH_METHOD"]
@@ -0,0 +1,120 @@
+from datetime import datetime
+from threading import Lock, Thread
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, select, update
+
+from .cache import EVENTS_VERSION, bump_version
+from .models import Booking, Comment, Event, EventImage, EventSales, QueueEntry
+from .models import WaitingRoom
+from .sales import remove_event_sales
+from . import db
+
+# Rows of a deleted event's dependents removed per transaction, so that purging a
+# large event never holds the write lock for long
+PURGE_BATCH_SIZE = 1000
+
+# Dependents of an event that have their own ids, deleted in batches
+BATCHED_DEPENDENTS = [Booking, Comment, QueueEntry, EventImage]
+
+# Held while a background purge runs, so a process runs at most one at a time
+purging = Lock()
+
+
+def soft_delete_event(event):
+    """
+    Marks an event deleted, which hides it from listings and stops its bookings
+    at once. Its rows are removed later by purge_event.
+    Returns false if the event was already deleted.
+    """
+    deleted = db.session.execute(
+        update(Event.__table__)
+        .where(Event.id == event.id, Event.deleted_at.is_(None))
+        .values(deleted_at=datetime.now(), version=Event.version + 1)
+    ).rowcount
+    if not deleted:
+        db.session.rollback()
+        return False
+
+    # Bookings can't be made once the event is marked deleted, so the sales taken
+    # out in the same transaction are all of them
+    remove_event_sales(event.id, event.user_id)
+    db.session.commit()
+
+    # The listings no longer show the event
+    bump_version(EVENTS_VERSION)
+    return True
+
+
+def purge_event(event_id, batch_size=PURGE_BATCH_SIZE):
+    """
+    Deletes a deleted event and everything that refers to it, with set based
+    DELETE statements of at most batch_size rows each.
+    """
+    for model in BATCHED_DEPENDENTS:
+        table = model.__table__
+        ids = select(table.c.id).where(table.c.event_id == event_id).limit(batch_size)
+        while True:
+            result = db.session.execute(delete(table).where(table.c.id.in_(ids)))
+            db.session.commit()
+            if result.rowcount < batch_size:
+                break
+
+    for model in [WaitingRoom, EventSales]:
+        db.session.execute(
+            delete(model.__table__).where(model.__table__.c.event_id == event_id)
+        )
+    db.session.execute(
+        delete(Event.__table__).where(
+            Event.id == event_id, Event.deleted_at.isnot(None)
+        )
+    )
+    db.session.commit()
+
+
+def purge_deleted_events():
+    """
+    Purges every deleted event, oldest first, and returns how many were purged.
+    """
+    count = 0
+    while True:
+        event_id = (
+            db.session.query(Event.id)
+            .filter(Event.deleted_at.isnot(None))
+            .order_by(Event.deleted_at)
+            .limit(1)
+            .scalar()
+        )
+        if event_id is None:
+            return count
+        purge_event(event_id)
+        count += 1
+
+
+def start_purge(app):
+    """
+    Purges deleted events in a background thread, unless one is already running.
+    An event deleted just as a purge finishes waits for the next purge, or for
+    the purge-events command.
+    """
+    if not purging.acquire(blocking=False):
+        return
+
+    def run():
+        try:
+            with app.app_context():
+                purge_deleted_events()
+        finally:
+            purging.release()
+
+    Thread(target=run, daemon=True).start()
+
+
+@click.command("purge-events")
+@with_appcontext
+def purge_events():
+    """
+    Purges the rows of every deleted event, for events a background purge missed.
+    """
+    count = purge_deleted_events()
+    click.echo(f"Purged {count} deleted events")
@@ -0,0 +1,195 @@
+import sys
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import event as sqlalchemy_event
+
+from .models import Booking, Comment, Event, EventImage, User
+from .pagination import encode_cursor
+from .purge import purge_event
+from . import db
+
+# Listing filters that are checked, one request each
+LISTING_FILTERS = [
+    {},
+    {"title": "concert"},
+    {"artist": "band"},
+    {"genre": "rock"},
+    {"title": "concert", "artist": "band", "genre": "rock"},
+    {"status": "upcoming"},
+    {"status": "booked"},
+    {"status": "cancelled"},
+    {"aftertimestamp": "2021-01-01T00:00"},
+    {"beforetimestamp": "2031-01-01T00:00"},
+    {"aftertimestamp": "2021-01-01T00:00", "status": "upcoming"},
+]
+
+
+def explain(connection, statement, parameters, prefer_indexes=True):
+    """
+    Returns the lines of the query plan of a statement.
+    prefer_indexes makes PostgreSQL avoid sequential scans for the rest of the
+    transaction, so only pass it for transactions that are rolled back.
+    """
+    dialect = connection.dialect.name
+
+    if dialect == "sqlite":
+        rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+        return [row[-1] for row in rows]
+
+    if dialect == "postgresql":
+        # Tables in a development database are too small for the planner to prefer
+        # an index, so only report sequential scans that cannot be avoided
+        if prefer_indexes:
+            connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        rows = connection.exec_driver_sql("EXPLAIN " + statement, parameters)
+        return [row[0] for row in rows]
+
+    return []
+
+
+def is_full_scan(line):
+    """
+    Returns true if a query plan line reads a whole table instead of an index.
+    """
+    line = line.strip()
+
+    # e.g. "SCAN events", but not "SCAN events USING INDEX ..." or "SCAN events_fts VIRTUAL TABLE ..."
+    if (
+        line.startswith("SCAN ")
+        and " USING " not in line
+        and "VIRTUAL TABLE" not in line
+    ):
+        return not line.startswith("SCAN CONSTANT ROW")
+
+    return "Seq Scan" in line
+
+
+def check_requests(client, event, user):
+    """
+    Issues a request to every route the blueprints serve, using the given event and user.
+    """
+    # Listings are streamed, so the queries of their templates only run as the
+    # body is read
+    for filters in LISTING_FILTERS:
+        client.get("/findevents/", query_string=filters).get_data()
+
+    cursor = encode_cursor(
+        "after", [event.timestamp, event.id], [Event.timestamp, Event.id]
+    )
+    client.get("/findevents/", query_string={"cursor": cursor}).get_data()
+
+    comment_cursor = encode_cursor(
+        "after", [event.timestamp, 0], [Comment.timestamp, Comment.id]
+    )
+    client.get("/findevents/" + str(event.id) + "/comments")
+    client.get(
+        "/findevents/" + str(event.id) + "/comments",
+        query_string={"cursor": comment_cursor},
+    )
+
+    for image in event.images:
+        client.get("/images/" + image.digest)
+
+    client.post("/account", data={"email": user.email, "password": "wrong password"})
+
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user.id)
+        session["_fresh"] = True
+
+    client.get("/findevents/" + str(event.id))
+    client.post(
+        "/findevents/" + str(event.id),
+        data={"desc": "Query plan check", "event_id": event.id},
+    )
+    client.post(
+        "/findevents/" + str(event.id),
+        data={"tickets": 1, "price": event.price, "event_id": event.id},
+    )
+    client.get("/myevents/").get_data()
+    client.get("/myevents/sales")
+    client.get("/bookedevents/").get_data()
+    # Exports are streamed, so their queries only run as the body is read
+    client.get("/myevents/export/events.csv").get_data()
+    client.get("/myevents/export/bookings.json").get_data()
+    client.post(
+        "/myevents/",
+        data={
+            "title": event.title,
+            "artist": event.artist,
+            "genre": event.genre,
+            "timestamp": event.timestamp.strftime("%Y-%m-%dT%H:%M"),
+            "venue_name": event.venue_name,
+            "venue_address": event.venue_address,
+            "desc": event.desc,
+            "status": event.status,
+            "tickets": event.tickets,
+            "price": event.price,
+            "event_id": event.id,
+        },
+    )
+    client.get("/myevents/delete/" + str(event.id))
+
+
+@click.command("check-plans")
+@with_appcontext
+def check_plans():
+    """
+    Explains every query the blueprints issue and fails if any reads a whole table.
+    Writes are flushed but never committed, so the database is left unchanged.
+    """
+    # Prefer an event with an image and bookings, so that every query is issued
+    event = (
+        Event.query.join(EventImage).join(Booking).first()
+        or Event.query.join(EventImage).first()
+        or Event.query.first()
+    )
+    if event is None:
+        click.echo("No events to check query plans with")
+        sys.exit(1)
+    user = User.query.get(event.user_id)
+
+    statements = []
+
+    def capture(connection, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(
+            ("SELECT", "UPDATE", "DELETE")
+        ):
+            statements.append((statement, parameters))
+
+    engine = db.engine
+    sqlalchemy_event.listen(engine, "after_cursor_execute", capture)
+    csrf_enabled = current_app.config.get("WTF_CSRF_ENABLED", True)
+    current_app.config["WTF_CSRF_ENABLED"] = False
+    db.session.commit = db.session.flush
+    try:
+        check_requests(current_app.test_client(), event, user)
+        # Deleted events are purged in the background, outside of any request
+        purge_event(event.id)
+    finally:
+        del db.session.commit
+        current_app.config["WTF_CSRF_ENABLED"] = csrf_enabled
+        sqlalchemy_event.remove(engine, "after_cursor_execute", capture)
+
+    # Explain each distinct statement once, within the uncommitted transaction
+    failures = 0
+    checked = set()
+    connection = db.session.connection()
+    for statement, parameters in statements:
+        if statement in checked:
+            continue
+        checked.add(statement)
+
+        plan = explain(connection, statement, parameters)
+        if any(is_full_scan(line) for line in plan):
+            failures += 1
+            click.echo("Full scan in query:")
+            click.echo("  " + " ".join(statement.split()))
+            for line in plan:
+                click.echo("    " + line)
+
+    db.session.rollback()
+
+    click.echo(f"Checked {len(checked)} queries, {failures} full scans")
+    if failures:
+        sys.exit(1)
@@ -0,0 +1,91 @@
+from collections import OrderedDict
+from math import ceil
+from threading import Lock
+from time import monotonic
+import os
+from flask import current_app
+from werkzeug.exceptions import TooManyRequests
+
+from .config import set_defaults
+
+# Login and register rate limits. Each client may make a burst of attempts, then one
+# attempt per interval. A burst of 0 turns a limit off
+RATE_LIMIT_DEFAULTS = {
+    "AUTH_IP_BURST": int(os.getenv("AUTH_IP_BURST", 20)),
+    "AUTH_IP_INTERVAL": float(os.getenv("AUTH_IP_INTERVAL", 6)),
+    "AUTH_EMAIL_BURST": int(os.getenv("AUTH_EMAIL_BURST", 5)),
+    "AUTH_EMAIL_INTERVAL": float(os.getenv("AUTH_EMAIL_INTERVAL", 30)),
+}
+
+# Clients tracked by each limit before the least recently seen are forgotten
+DEFAULT_SIZE = 10000
+
+# Limits of attempts from each client address and at each account's email
+AUTH_IP = "AUTH_IP"
+AUTH_EMAIL = "AUTH_EMAIL"
+
+
+class TokenBuckets:
+    """
+    Token buckets of a rate limit, one per client, in the memory of one worker process.
+    Every worker keeps its own buckets, so a client can make up to the burst in each.
+    """
+
+    def __init__(self, burst, interval, size=DEFAULT_SIZE):
+        self.burst = burst
+        self.interval = interval
+        self.size = size
+        self.buckets = OrderedDict()
+        self.lock = Lock()
+
+    def take(self, key, now=None):
+        """
+        Takes a token from a client's bucket, and returns 0 if there was one, or
+        else the seconds until there will be.
+        """
+        now = monotonic() if now is None else now
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) / self.interval)
+
+            wait = 0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) * self.interval
+
+            self.buckets[key] = (tokens, now)
+            while len(self.buckets) > self.size:
+                self.buckets.popitem(last=False)
+
+        return wait
+
+
+def init_app(app):
+    """
+    Sets the rate limit defaults and creates the token buckets of each limit.
+    """
+    set_defaults(app, RATE_LIMIT_DEFAULTS)
+
+    config = app.config
+    app.extensions["ratelimit"] = {
+        name: TokenBuckets(config[name + "_BURST"], config[name + "_INTERVAL"])
+        for name in (AUTH_IP, AUTH_EMAIL)
+        if config[name + "_BURST"] > 0
+    }
+
+
+def limit(name, key):
+    """
+    Takes a token from a client's bucket of a rate limit.
+    Aborts with 429 too many requests if the bucket is empty.
+    """
+    buckets = current_app.extensions["ratelimit"].get(name)
+    if buckets is None or not key:
+        return
+
+    wait = buckets.take(key)
+    if wait:
+        raise TooManyRequests(
+            "Too many attempts, please try again later", retry_after=ceil(wait)
+        )
@@ -0,0 +1,197 @@
+import os
+import zlib
+from flask import Response, current_app, get_flashed_messages, render_template
+from flask import request, stream_with_context
+from flask.signals import before_render_template, template_rendered
+
+from .config import set_defaults
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Response compression and streaming settings
+RESPONSE_DEFAULTS = {
+    "COMPRESS_RESPONSES": os.getenv("COMPRESS_RESPONSES", "1") == "1",
+    # Smaller responses are sent as they are, as compressing them saves less than
+    # it costs. Streamed responses have no size up front and are always compressed
+    "COMPRESS_MIN_SIZE": int(os.getenv("COMPRESS_MIN_SIZE", 1024)),
+    # Fast levels, as dynamic responses are compressed for every request
+    "COMPRESS_GZIP_LEVEL": 6,
+    "COMPRESS_BROTLI_QUALITY": 4,
+    "STREAM_TEMPLATES": os.getenv("STREAM_TEMPLATES", "1") == "1",
+    # Characters of a streamed page sent at a time
+    "STREAM_CHUNK_SIZE": 8192,
+}
+
+COMPRESSED_MIMETYPES = {
+    "text/html",
+    "text/css",
+    "text/csv",
+    "text/plain",
+    "text/javascript",
+    "application/json",
+}
+
+
+class GzipEncoder:
+    """
+    Compresses a response with gzip, a chunk at a time.
+    """
+
+    def __init__(self, config):
+        self.compressor = zlib.compressobj(
+            config["COMPRESS_GZIP_LEVEL"], zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliEncoder:
+    """
+    Compresses a response with brotli, a chunk at a time.
+    """
+
+    def __init__(self, config):
+        self.compressor = brotli.Compressor(quality=config["COMPRESS_BROTLI_QUALITY"])
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+# Encoders in order of preference, brotli only if it is installed
+ENCODERS = {"gzip": GzipEncoder}
+if brotli is not None:
+    ENCODERS = {"br": BrotliEncoder, **ENCODERS}
+
+
+def accepted_encoding():
+    """
+    Returns the preferred encoding the client accepts, or None to send it as it is.
+    """
+    for encoding in ENCODERS:
+        if request.accept_encodings[encoding]:
+            return encoding
+    return None
+
+
+def compress_chunks(chunks, encoder):
+    """
+    Yields the compressed chunks of a streamed response. Each chunk is flushed, so
+    the client can render the start of a page while the rest is rendered.
+    """
+    for chunk in chunks:
+        data = encoder.compress(chunk) + encoder.flush()
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+def compress_response(response):
+    """
+    Compresses a response with the best encoding the client accepts, if its type
+    is worth compressing and it isn't too small or encoded already.
+    """
+    config = current_app.config
+    if response.mimetype not in COMPRESSED_MIMETYPES:
+        return response
+    response.vary.add("Accept-Encoding")
+
+    if (
+        response.status_code < 200
+        or response.status_code in (204, 304)
+        or request.method == "HEAD"
+        or response.direct_passthrough
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    encoding = accepted_encoding()
+    if encoding is None:
+        return response
+    encoder = ENCODERS[encoding](config)
+
+    if response.is_streamed:
+        response.response = compress_chunks(response.iter_encoded(), encoder)
+        response.headers.pop("Content-Length", None)
+    else:
+        data = response.get_data()
+        if len(data) < config["COMPRESS_MIN_SIZE"]:
+            return response
+        response.set_data(encoder.compress(data) + encoder.finish())
+
+    response.headers["Content-Encoding"] = encoding
+    # The encoded bytes differ, though they mean the same, so only a weak tag holds
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    """
+    Sets the compression and streaming defaults, and compresses the app's responses
+    if COMPRESS_RESPONSES is set.
+    """
+    set_defaults(app, RESPONSE_DEFAULTS)
+
+    if app.config["COMPRESS_RESPONSES"]:
+        app.after_request(compress_response)
+
+
+def buffer_chunks(chunks, size):
+    """
+    Joins the many small strings a template yields into chunks of about a size.
+    """
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def stream_template(template_name, **context):
+    """
+    Returns a response that renders a template as it is sent, so the top of a page
+    reaches the client before its rows are rendered. Renders the whole template at
+    once instead if STREAM_TEMPLATES is off.
+    """
+    app = current_app._get_current_object()
+    if not app.config["STREAM_TEMPLATES"]:
+        return render_template(template_name, **context)
+
+    # The session is saved before the body is sent, so the template's flashed
+    # messages are taken out of it now, and kept for the template in the request
+    get_flashed_messages()
+
+    app.update_template_context(context)
+    template = app.jinja_env.get_or_select_template(template_name)
+
+    def generate():
+        before_render_template.send(app, template=template, context=context)
+        yield from buffer_chunks(
+            template.generate(context), app.config["STREAM_CHUNK_SIZE"]
+        )
+        template_rendered.send(app, template=template, context=context)
+
+    return Response(stream_with_context(generate()), mimetype="text/html")
@@ -0,0 +1,188 @@
+from datetime import date, timedelta
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import contains_eager
+
+from .models import Booking, DailySales, Event, EventSales
+from . import db
+
+# Days of daily sales shown on the organiser dashboard
+DASHBOARD_DAYS = 30
+
+# Dialects whose inserts can add to an existing row, with ON CONFLICT DO UPDATE
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def add_to_totals(table, keys, tickets, revenue, bookings):
+    """
+    Adds to the running totals of a rollup row, creating the row if it doesn't exist.
+    Concurrent bookings can't both create the row, as the insert falls back to an update.
+    """
+    totals = {"tickets": tickets, "revenue": revenue, "bookings": bookings}
+    dialect = db.session.get_bind().dialect.name
+    statement = UPSERT_INSERTS[dialect](table).values(**keys, **totals)
+    db.session.execute(
+        statement.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={name: table.c[name] + statement.excluded[name] for name in totals},
+        )
+    )
+
+
+def record_sale(event_id, organiser_id, day, tickets, price):
+    """
+    Adds a booking to the sales rollups of its event and of its organiser's day.
+    Called within the booking's transaction, so the rollups commit or roll back with it.
+    """
+    revenue = tickets * price
+    add_to_totals(EventSales.__table__, {"event_id": event_id}, tickets, revenue, 1)
+    if organiser_id is not None:
+        add_to_totals(
+            DailySales.__table__,
+            {"user_id": organiser_id, "day": day},
+            tickets,
+            revenue,
+            1,
+        )
+
+
+def remove_event_sales(event_id, organiser_id):
+    """
+    Takes the bookings of a deleted event out of the sales rollups.
+    """
+    days = (
+        db.session.query(
+            func.date(Booking.timestamp),
+            func.sum(Booking.tickets),
+            func.sum(Booking.tickets * Booking.price),
+            func.count(),
+        )
+        .filter(Booking.event_id == event_id)
+        .group_by(func.date(Booking.timestamp))
+        .all()
+    )
+    if organiser_id is not None:
+        for day, tickets, revenue, bookings in days:
+            if isinstance(day, str):
+                day = date.fromisoformat(day)
+            add_to_totals(
+                DailySales.__table__,
+                {"user_id": organiser_id, "day": day},
+                -tickets,
+                -revenue,
+                -bookings,
+            )
+        # Days left without bookings are dropped, as a rebuild would leave them out
+        db.session.execute(
+            delete(DailySales.__table__).where(
+                DailySales.user_id == organiser_id, DailySales.bookings <= 0
+            )
+        )
+    db.session.execute(
+        delete(EventSales.__table__).where(EventSales.event_id == event_id)
+    )
+
+
+def event_sales(user_id):
+    """
+    Returns a query of an organiser's events, loaded with their sales totals.
+    """
+    return (
+        Event.query.outerjoin(Event.sales)
+        .options(contains_eager(Event.sales))
+        .filter(Event.user_id == user_id, Event.deleted_at.is_(None))
+    )
+
+
+def total_sales(user_id):
+    """
+    Returns the tickets sold, revenue and bookings of all of an organiser's events.
+    """
+    tickets, revenue, bookings = (
+        db.session.query(
+            func.coalesce(func.sum(EventSales.tickets), 0),
+            func.coalesce(func.sum(EventSales.revenue), 0),
+            func.coalesce(func.sum(EventSales.bookings), 0),
+        )
+        .join(Event, EventSales.event_id == Event.id)
+        .filter(Event.user_id == user_id, Event.deleted_at.is_(None))
+        .one()
+    )
+    return {"tickets": tickets, "revenue": revenue, "bookings": bookings}
+
+
+def daily_sales(user_id, days=DASHBOARD_DAYS):
+    """
+    Returns an organiser's sales totals of each of the last days, oldest first.
+    Days without sales are included, with totals of zero.
+    """
+    today = date.today()
+    first = today - timedelta(days=days - 1)
+    rows = {
+        row.day: row
+        for row in DailySales.query.filter(
+            DailySales.user_id == user_id, DailySales.day >= first
+        )
+    }
+    sales = []
+    for offset in range(days):
+        day = first + timedelta(days=offset)
+        row = rows.get(day)
+        sales.append(
+            {
+                "day": day,
+                "tickets": row.tickets if row else 0,
+                "revenue": row.revenue if row else 0,
+                "bookings": row.bookings if row else 0,
+            }
+        )
+    return sales
+
+
+@click.command("rebuild-sales")
+@with_appcontext
+def rebuild_sales():
+    """
+    Recounts the sales rollups from the bookings of events that aren't deleted,
+    in one transaction.
+    Backfills the rollups of bookings made before they were kept, or repairs them.
+    """
+    db.session.execute(delete(EventSales))
+    db.session.execute(delete(DailySales))
+
+    db.session.execute(
+        insert(EventSales).from_select(
+            ["event_id", "tickets", "revenue", "bookings"],
+            select(
+                Booking.event_id,
+                func.sum(Booking.tickets),
+                func.sum(Booking.tickets * Booking.price),
+                func.count(),
+            )
+            .join(Event, Booking.event_id == Event.id)
+            .where(Event.deleted_at.is_(None))
+            .group_by(Booking.event_id),
+        )
+    )
+    db.session.execute(
+        insert(DailySales).from_select(
+            ["user_id", "day", "tickets", "revenue", "bookings"],
+            select(
+                Event.user_id,
+                func.date(Booking.timestamp),
+                func.sum(Booking.tickets),
+                func.sum(Booking.tickets * Booking.price),
+                func.count(),
+            )
+            .join(Event, Booking.event_id == Event.id)
+            .where(Event.user_id.isnot(None), Event.deleted_at.is_(None))
+            .group_by(Event.user_id, func.date(Booking.timestamp)),
+        )
+    )
+    db.session.commit()
+
+    events = db.session.query(func.count()).select_from(EventSales).scalar()
+    days = db.session.query(func.count()).select_from(DailySales).scalar()
+    click.echo(f"Rebuilt the sales of {events} events over {days} organiser days")
@@ -0,0 +1,73 @@
+import re
+from sqlalchemy import func, literal_column, table, column
+
+from .models import Event
+from . import db
+
+# Event columns that can be searched, in order of relevance weight
+SEARCH_FIELDS = ["title", "artist", "genre"]
+
+# SQLite FTS5 external content table over the searchable event columns.
+# It is kept in sync with events by triggers, see the full text search migration.
+# Note that recreating the events table (e.g. an alembic batch migration in
+# "recreate" mode) drops these triggers, so such migrations must recreate them.
+events_fts = table(
+    "events_fts", column("rowid"), *[column(field) for field in SEARCH_FIELDS]
+)
+
+
+def search_terms(text):
+    """
+    Splits search text into lowercase word tokens.
+    Anything that is not a word character is dropped, so tokens are safe to quote.
+    """
+    return re.findall(r"\w+", text.lower())
+
+
+def search_events(query, filters):
+    """
+    Filters an event query by full text search on each field in filters.
+    Every term is prefix matched, and all terms must match.
+    Returns the filtered query and a relevance expression that sorts the best
+    matches first when ordered ascending, or None if nothing was searched.
+    """
+    filters = {
+        field: search_terms(text)
+        for field, text in filters.items()
+        if field in SEARCH_FIELDS and search_terms(text)
+    }
+    if not filters:
+        return query, None
+
+    dialect = db.engine.dialect.name
+
+    if dialect == "sqlite":
+        # FTS5 column filters, e.g. title : ("rock"* "night"*) AND artist : ("oasis"*)
+        match = " AND ".join(
+            "{} : ({})".format(field, " ".join('"{}"*'.format(term) for term in terms))
+            for field, terms in filters.items()
+        )
+        query = query.join(events_fts, events_fts.c.rowid == Event.id).filter(
+            literal_column("events_fts").match(match)
+        )
+        # bm25 scores are negative, lower is more relevant
+        rank = func.bm25(literal_column("events_fts"), 10.0, 5.0, 1.0)
+        return query, rank
+
+    if dialect == "postgresql":
+        # Must match the expression indexes created by the full text search migration
+        rank = 0
+        for field, terms in filters.items():
+            vector = func.to_tsvector(literal_column("'simple'"), getattr(Event, field))
+            tsquery = func.to_tsquery(
+                literal_column("'simple'"), " & ".join(term + ":*" for term in terms)
+            )
+            query = query.filter(vector.op("@@")(tsquery))
+            rank = rank - func.ts_rank(vector, tsquery)
+        return query, rank
+
+    # Other databases fall back to unranked pattern matching
+    for field, terms in filters.items():
+        for term in terms:
+            query = query.filter(getattr(Event, field).ilike("%" + term + "%"))
+    return query, None
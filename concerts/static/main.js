@@ -4,3 +4,44 @@ function auto_grow_textarea(element) {
     element.style.height = element.scrollHeight + "px";
   }
 }
+
+// Polls the waiting room status until the booking is made, then shows the event.
+// If the event is gone, the user is sent back to the event list
+function poll_waiting_room(element) {
+  fetch(element.dataset.statusUrl, { credentials: "same-origin" })
+    .then((response) => {
+      if (response.status === 404 || response.status === 410) {
+        return { done: true, redirect: element.dataset.goneUrl };
+      }
+      return response.json();
+    })
+    .then((status) => {
+      if (status.done) {
+        window.location.href = status.redirect;
+        return;
+      }
+      document.getElementById("waiting-room-position").textContent =
+        status.position;
+      setTimeout(() => poll_waiting_room(element), status.retry_after * 1000);
+    })
+    .catch(() => setTimeout(() => poll_waiting_room(element), 5000));
+}
+
+const waiting_room = document.getElementById("waiting-room");
+if (waiting_room) {
+  poll_waiting_room(waiting_room);
+}
+
+// Replaces a "Load more comments" button with the next page of comments
+document.addEventListener("click", (event) => {
+  const link = event.target.closest("[data-load-comments]");
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  fetch(link.href, { credentials: "same-origin" })
+    .then((response) => response.text())
+    .then((html) => {
+      link.parentElement.outerHTML = html;
+    });
+});
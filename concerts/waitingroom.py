@@ -0,0 +1,194 @@
+from datetime import datetime, timedelta
+from secrets import token_urlsafe
+from time import time
+from flask import current_app
+from sqlalchemy import delete, func, or_, update
+from sqlalchemy.exc import IntegrityError
+
+from .booking import book_tickets
+from .config import set_defaults
+from .models import QueueEntry, WaitingRoom
+from . import db
+
+WAITING_ROOM_DEFAULTS = {
+    # Bookings admitted per second for each event, and how many can be admitted at once
+    "WAITING_ROOM_RATE": 20,
+    "WAITING_ROOM_BURST": 20,
+    # Seconds after which an entry still being processed is given up on
+    "WAITING_ROOM_CLAIM_TIMEOUT": 60,
+    # Seconds that admitted entries are kept, for their waiting room page to read
+    # the result
+    "WAITING_ROOM_RETENTION": 3600,
+}
+
+# Result of an entry whose booking is being made
+PROCESSING = "processing"
+
+# Result of an entry whose booking was cut off, and may or may not have been made
+INTERRUPTED = "interrupted"
+
+
+def init_app(app):
+    """
+    Sets the waiting room defaults.
+    """
+    set_defaults(app, WAITING_ROOM_DEFAULTS)
+
+
+def enqueue(event_id, user_id, tickets):
+    """
+    Adds a booking request to the back of an event's queue and returns its entry.
+    """
+    entry = QueueEntry(
+        token=token_urlsafe(16), event_id=event_id, user_id=user_id, tickets=tickets
+    )
+    db.session.add(entry)
+    db.session.commit()
+    return entry
+
+
+def advance(event_id):
+    """
+    Admits queue entries at the configured rate, using a token bucket per event.
+    Safe to call concurrently from any number of workers, only one of them will
+    advance the queue for each moment in time.
+    """
+    rate = current_app.config["WAITING_ROOM_RATE"]
+    burst = current_app.config["WAITING_ROOM_BURST"]
+    now = time()
+
+    room = WaitingRoom.query.get(event_id)
+    if room is None:
+        room = WaitingRoom(
+            event_id=event_id, admitted_id=0, allowance=burst, updated=now
+        )
+        db.session.add(room)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another worker created the waiting room first
+            db.session.rollback()
+            room = WaitingRoom.query.get(event_id)
+
+    allowance = min(burst, room.allowance + (now - room.updated) * rate)
+    admitted_id = room.admitted_id
+
+    # Admit as many waiting entries as the allowance covers
+    ids = (
+        db.session.query(QueueEntry.id)
+        .filter(QueueEntry.event_id == event_id, QueueEntry.id > admitted_id)
+        .order_by(QueueEntry.id)
+        .limit(int(allowance))
+        .all()
+    )
+
+    # If nobody can be admitted yet, the allowance keeps accruing from the last update
+    if not ids:
+        db.session.rollback()
+        return
+
+    admitted_id = ids[-1].id
+    allowance -= len(ids)
+
+    # Only applies if no other worker advanced the queue since it was read
+    advanced = db.session.execute(
+        update(WaitingRoom.__table__)
+        .where(WaitingRoom.event_id == event_id, WaitingRoom.updated == room.updated)
+        .values(admitted_id=admitted_id, allowance=allowance, updated=now)
+    ).rowcount
+    if advanced:
+        prune(event_id, room.admitted_id, now)
+    db.session.commit()
+
+
+def prune(event_id, admitted_id, now):
+    """
+    Deletes the old admitted entries of an event's queue, other than those whose
+    booking is being made, so the queue doesn't grow with every booking.
+    """
+    retention = current_app.config["WAITING_ROOM_RETENTION"]
+    timeout = current_app.config["WAITING_ROOM_CLAIM_TIMEOUT"]
+    db.session.execute(
+        delete(QueueEntry.__table__).where(
+            QueueEntry.event_id == event_id,
+            QueueEntry.id <= admitted_id,
+            QueueEntry.timestamp < datetime.now() - timedelta(seconds=retention),
+            or_(
+                QueueEntry.result.is_(None),
+                QueueEntry.result != PROCESSING,
+                QueueEntry.claimed < now - timeout,
+            ),
+        )
+    )
+
+
+def is_admitted(entry):
+    """
+    Returns true if a queue entry has reached the front of its queue.
+    """
+    admitted_id = (
+        db.session.query(WaitingRoom.admitted_id)
+        .filter(WaitingRoom.event_id == entry.event_id)
+        .scalar()
+    )
+    return admitted_id is not None and entry.id <= admitted_id
+
+
+def position(entry):
+    """
+    Returns the number of entries waiting ahead of a queue entry.
+    """
+    admitted_id = (
+        db.session.query(WaitingRoom.admitted_id)
+        .filter(WaitingRoom.event_id == entry.event_id)
+        .scalar()
+    ) or 0
+    return (
+        db.session.query(func.count(QueueEntry.id))
+        .filter(
+            QueueEntry.event_id == entry.event_id,
+            QueueEntry.id > admitted_id,
+            QueueEntry.id < entry.id,
+        )
+        .scalar()
+    )
+
+
+def process(entry):
+    """
+    Makes the booking of an admitted queue entry, exactly once, and returns its result.
+    An entry left processing for too long, e.g. by a worker that died, is marked as
+    interrupted rather than booked again, as its booking may already have been made.
+    """
+    now = time()
+    timeout = current_app.config["WAITING_ROOM_CLAIM_TIMEOUT"]
+    db.session.execute(
+        update(QueueEntry.__table__)
+        .where(
+            QueueEntry.id == entry.id,
+            QueueEntry.result == PROCESSING,
+            QueueEntry.claimed < now - timeout,
+        )
+        .values(result=INTERRUPTED)
+    )
+    claimed = db.session.execute(
+        update(QueueEntry.__table__)
+        .where(QueueEntry.id == entry.id, QueueEntry.result == None)
+        .values(result=PROCESSING, claimed=now)
+    ).rowcount
+    db.session.commit()
+
+    # If another request already claimed the entry, report its result instead
+    if not claimed:
+        db.session.refresh(entry)
+        return entry.result
+
+    result = INTERRUPTED
+    try:
+        result = book_tickets(entry.event_id, entry.user_id, entry.tickets)
+    finally:
+        # The entry never stays processing, even if the booking raised
+        db.session.rollback()
+        entry.result = result
+        db.session.commit()
+    return entry.result
@@ -0,0 +1,27 @@
+"""
+Gunicorn settings, read from the working directory when gunicorn starts.
+
+GUNICORN_WORKER_CLASS selects how each worker serves requests:
+    sync    one request at a time, the default
+    gevent  up to GUNICORN_WORKER_CONNECTIONS requests at a time on greenlets,
+            which wait on the database and clients without blocking each other
+"""
+import os
+
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "sync")
+
+if worker_class == "gevent":
+    worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 100))
+
+    # A worker's greenlets share its connection pool, so it needs more connections
+    # than a sync worker, and waits for one rather than failing under bursts
+    os.environ.setdefault("DATABASE_POOL_SIZE", "10")
+    os.environ.setdefault("DATABASE_MAX_OVERFLOW", "20")
+
+
+def post_worker_init(worker):
+    if worker_class == "gevent":
+        from concerts.database import make_green
+
+        make_green()
@@ -0,0 +1,82 @@
+"""add full text search index
+
+Revision ID: 1d58ff0dd541
+Revises: a1b9c7a701a6
+Create Date: 2026-10-18 14:25:28.209557
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '1d58ff0dd541'
+down_revision = 'a1b9c7a701a6'
+branch_labels = None
+depends_on = None
+
+
+SEARCH_FIELDS = ['title', 'artist', 'genre']
+
+SQLITE_UPGRADE = [
+    """
+    CREATE VIRTUAL TABLE events_fts USING fts5(
+        title, artist, genre, content='events', content_rowid='id', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER events_fts_insert AFTER INSERT ON events BEGIN
+        INSERT INTO events_fts (rowid, title, artist, genre)
+        VALUES (new.id, new.title, new.artist, new.genre);
+    END
+    """,
+    """
+    CREATE TRIGGER events_fts_delete AFTER DELETE ON events BEGIN
+        INSERT INTO events_fts (events_fts, rowid, title, artist, genre)
+        VALUES ('delete', old.id, old.title, old.artist, old.genre);
+    END
+    """,
+    """
+    CREATE TRIGGER events_fts_update AFTER UPDATE OF title, artist, genre ON events BEGIN
+        INSERT INTO events_fts (events_fts, rowid, title, artist, genre)
+        VALUES ('delete', old.id, old.title, old.artist, old.genre);
+        INSERT INTO events_fts (rowid, title, artist, genre)
+        VALUES (new.id, new.title, new.artist, new.genre);
+    END
+    """,
+    "INSERT INTO events_fts (events_fts) VALUES ('rebuild')",
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER events_fts_update",
+    "DROP TRIGGER events_fts_delete",
+    "DROP TRIGGER events_fts_insert",
+    "DROP TABLE events_fts",
+]
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        for statement in SQLITE_UPGRADE:
+            op.execute(statement)
+
+    elif dialect == 'postgresql':
+        # Expression indexes, the expressions must match those in concerts/search.py
+        for field in SEARCH_FIELDS:
+            op.execute(
+                "CREATE INDEX ix_events_{0}_search ON events "
+                "USING gin (to_tsvector('simple', {0}))".format(field)
+            )
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == 'sqlite':
+        for statement in SQLITE_DOWNGRADE:
+            op.execute(statement)
+
+    elif dialect == 'postgresql':
+        for field in SEARCH_FIELDS:
+            op.execute("DROP INDEX ix_events_{0}_search".format(field))
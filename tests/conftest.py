@@ -0,0 +1,118 @@
+from datetime import datetime
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def app(tmp_path_factory):
+    """
+    The app with a migrated database of its own, and one organiser.
+    The app is a module level singleton, so it is created once per test session.
+    """
+    from flask_migrate import upgrade
+    from concerts import create_app, db
+    from concerts.models import User
+
+    path = tmp_path_factory.mktemp("db") / "test.sqlite"
+    app = create_app(
+        {
+            "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}",
+            "WTF_CSRF_ENABLED": False,
+            "TESTING": True,
+        }
+    )
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, "migrations"))
+        db.session.add(
+            User(
+                username="organiser",
+                email="organiser@example.com",
+                hash="unused",
+                contact_number=400000000,
+                address="1 Test Street",
+            )
+        )
+        db.session.commit()
+    return app
+
+
+# Tables emptied after each test, children before their parents
+DATA_TABLES = [
+    "queue_entries",
+    "waiting_rooms",
+    "bookings",
+    "comments",
+    "event_images",
+    "event_sales",
+    "daily_sales",
+    "events",
+]
+
+
+@pytest.fixture
+def organiser(app):
+    """
+    The id of the organiser, whose events and everything about them are deleted
+    after each test.
+    """
+    from concerts import cache, db
+    from concerts.models import User
+
+    with app.app_context():
+        user_id = User.query.filter(User.email == "organiser@example.com").one().id
+    yield user_id
+    with app.app_context():
+        for name in DATA_TABLES:
+            db.session.execute(db.metadata.tables[name].delete())
+        db.session.commit()
+    # Cached listings and cards showed the deleted events, whose ids can be reused
+    cache.init_app(app)
+
+
+@pytest.fixture
+def make_event(app, organiser):
+    """
+    Returns a function that adds an upcoming event of the organiser, and returns its id.
+    """
+    from concerts import db
+    from concerts.models import Event
+
+    def make_event(**values):
+        event = Event(
+            title="Event",
+            artist="Artist",
+            genre="Rock",
+            timestamp=datetime(2099, 12, 31, 20),
+            venue_name="Venue",
+            venue_address="1 Venue Street",
+            desc="Description",
+            status="upcoming",
+            tickets=10,
+            price=25.0,
+            user_id=organiser,
+        )
+        for name, value in values.items():
+            setattr(event, name, value)
+        with app.app_context():
+            db.session.add(event)
+            db.session.commit()
+            return event.id
+
+    return make_event
+
+
+@pytest.fixture
+def client(app, organiser):
+    """
+    A test client logged in as the organiser.
+    """
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(organiser)
+        session["_fresh"] = True
+    return client
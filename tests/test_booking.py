@@ -0,0 +1,84 @@
+from datetime import date, datetime
+
+from concerts import db
+from concerts.booking import BOOKED, EVENT_NOT_FOUND, NOT_ENOUGH_TICKETS, book_tickets
+from concerts.models import Booking, DailySales, Event, EventSales
+
+
+def sales(event_id, user_id):
+    """
+    Returns the tickets, revenue and bookings of an event's and its organiser's
+    rollups for today.
+    """
+    rollups = []
+    for row in [
+        EventSales.query.get(event_id),
+        DailySales.query.get((user_id, date.today())),
+    ]:
+        rollups.append(row and (row.tickets, row.revenue, row.bookings))
+    return rollups
+
+
+def test_booking_takes_tickets_and_adds_sales(app, organiser, make_event):
+    event_id = make_event(tickets=10, price=25.0)
+    with app.app_context():
+        assert book_tickets(event_id, organiser, 2) == BOOKED
+        assert book_tickets(event_id, organiser, 3) == BOOKED
+
+        assert Event.query.get(event_id).tickets == 5
+        assert Booking.query.filter(Booking.event_id == event_id).count() == 2
+        assert sales(event_id, organiser) == [(5, 125.0, 2), (5, 125.0, 2)]
+
+
+def test_booking_more_tickets_than_left(app, organiser, make_event):
+    event_id = make_event(tickets=3)
+    with app.app_context():
+        assert book_tickets(event_id, organiser, 4) == NOT_ENOUGH_TICKETS
+        assert book_tickets(event_id, organiser, 3) == BOOKED
+        assert book_tickets(event_id, organiser, 1) == NOT_ENOUGH_TICKETS
+
+        assert Event.query.get(event_id).tickets == 0
+        assert Booking.query.filter(Booking.event_id == event_id).count() == 1
+        assert sales(event_id, organiser) == [(3, 75.0, 1), (3, 75.0, 1)]
+
+
+def test_booking_a_missing_event(app, organiser, make_event):
+    event_id = make_event()
+    with app.app_context():
+        assert book_tickets(event_id + 1, organiser, 1) == EVENT_NOT_FOUND
+        assert Booking.query.count() == 0
+
+
+def test_booking_a_deleted_event(app, organiser, make_event):
+    event_id = make_event(deleted_at=datetime.now())
+    with app.app_context():
+        assert book_tickets(event_id, organiser, 1) == EVENT_NOT_FOUND
+
+        assert Event.query.get(event_id).tickets == 10
+        assert Booking.query.count() == 0
+        assert sales(event_id, organiser) == [None, None]
+
+
+def test_concurrent_bookings_never_oversell(app, organiser, make_event):
+    from threading import Thread
+
+    event_id = make_event(tickets=5)
+    results = []
+
+    def book():
+        with app.app_context():
+            results.append(book_tickets(event_id, organiser, 1))
+            db.session.remove()
+
+    threads = [Thread(target=book) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with app.app_context():
+        booked = results.count(BOOKED)
+        assert booked + results.count(NOT_ENOUGH_TICKETS) == 10
+        assert booked == 5
+        assert Event.query.get(event_id).tickets == 0
+        assert sales(event_id, organiser) == [(5, 125.0, 5), (5, 125.0, 5)]
@@ -0,0 +1,152 @@
+from io import BytesIO
+import json
+
+from concerts.bulk import EVENT_FIELDS, import_events, read_csv, read_xlsx
+
+ROW = {
+    "title": "Imported",
+    "artist": "Artist",
+    "genre": "Rock",
+    "timestamp": "2099-12-31T20:00",
+    "venue_name": "Venue",
+    "venue_address": "1 Venue Street",
+    "desc": "Description",
+    "status": "upcoming",
+    "tickets": "100",
+    "price": "25.0",
+}
+
+
+def imported_titles(app, user_id):
+    from concerts.models import Event
+
+    with app.app_context():
+        return [
+            title
+            for title, in Event.query.with_entities(Event.title)
+            .filter(Event.user_id == user_id)
+            .order_by(Event.id)
+        ]
+
+
+def upload(client, content, filename):
+    return client.post(
+        "/myevents/import",
+        data={"file": (BytesIO(content), filename)},
+        content_type="multipart/form-data",
+    )
+
+
+def test_import_csv_upload(app, organiser, client):
+    lines = [",".join(EVENT_FIELDS)]
+    for title in ["First", "Second"]:
+        lines.append(",".join(dict(ROW, title=title)[name] for name in EVENT_FIELDS))
+    content = ("\ufeff" + "\r\n".join(lines) + "\r\n").encode("utf-8")
+
+    response = upload(client, content, "events.csv")
+
+    assert response.status_code == 200
+    assert b"Imported 2 events" in response.data
+    assert imported_titles(app, organiser) == ["First", "Second"]
+
+
+def make_xlsx(titles):
+    from openpyxl import Workbook
+
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(EVENT_FIELDS)
+    for title in titles:
+        sheet.append([dict(ROW, title=title)[name] for name in EVENT_FIELDS])
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def test_import_xlsx_upload(app, organiser, client):
+    response = upload(client, make_xlsx(["First", "Second"]), "events.xlsx")
+
+    assert response.status_code == 200
+    assert b"Imported 2 events" in response.data
+    assert imported_titles(app, organiser) == ["First", "Second"]
+
+
+class LinesOnly:
+    """
+    A file with only the methods of a SpooledTemporaryFile before Python 3.11,
+    which has no readable() for a TextIOWrapper, nor seekable() for zipfile.
+    """
+
+    def __init__(self, content):
+        self.file = BytesIO(content)
+
+    def __iter__(self):
+        return iter(self.file)
+
+    def read(self, size=-1):
+        return self.file.read(size)
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+
+def test_read_csv_without_readable():
+    content = b"title,artist\nFirst,Artist\n"
+
+    rows = list(read_csv(LinesOnly(content)))
+
+    assert rows == [(2, {"title": "First", "artist": "Artist"})]
+
+
+def test_import_jsonl_reports_bad_lines(app, organiser, client):
+    content = "\n".join(
+        [
+            json.dumps(dict(ROW, title="First")),
+            "{oops",
+            json.dumps(dict(ROW, title="Second")),
+        ]
+    ).encode("utf-8")
+
+    response = upload(client, content, "events.jsonl")
+
+    assert b"Imported 2 events" in response.data
+    assert b"The line is not valid JSON" in response.data
+    assert imported_titles(app, organiser) == ["First", "Second"]
+
+
+def test_import_csv_reports_undecodable_rows(app, organiser):
+    lines = [",".join(EVENT_FIELDS).encode("utf-8")]
+    for title in [b"First", b"Caf\xe9", b"Second"]:
+        values = [ROW[name].encode("utf-8") for name in EVENT_FIELDS]
+        values[0] = title
+        lines.append(b",".join(values))
+
+    with app.app_context():
+        rows = read_csv(BytesIO(b"\n".join(lines)))
+        result = import_events(rows, organiser, batch_size=1)
+
+    assert result.imported == 2
+    assert result.skipped == 1
+    assert result.errors == [(3, "The row is not valid UTF-8 text")]
+
+
+def test_import_keeps_rows_read_before_the_file_broke_off(app, organiser):
+    def rows():
+        yield 1, dict(ROW, title="First")
+        raise ValueError("The file broke off")
+
+    with app.app_context():
+        result = import_events(rows(), organiser)
+
+    assert result.imported == 1
+    assert result.failure == "The file broke off"
+    assert imported_titles(app, organiser) == ["First"]
+
+
+def test_read_xlsx_without_seekable():
+    rows = list(read_xlsx(LinesOnly(make_xlsx(["First"]))))
+
+    assert [(number, row["title"]) for number, row in rows] == [(2, "First")]
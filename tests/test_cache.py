@@ -0,0 +1,67 @@
+import pytest
+
+from concerts.bulk import EVENT_FIELDS
+from tests.test_bulk import ROW, upload
+
+
+@pytest.fixture
+def anonymous(app):
+    return app.test_client()
+
+
+def listing(client):
+    response = client.get("/findevents/")
+    # Streamed listings are cached once they have been read in full
+    html = response.get_data(as_text=True)
+    return response.headers["X-Cache"], html
+
+
+def test_booking_invalidates_the_listing(app, client, anonymous, make_event):
+    event_id = make_event(title="Nearly sold out", tickets=2)
+    assert listing(anonymous)[0] == "MISS"
+    cache, html = listing(anonymous)
+    assert cache == "HIT" and "<h3>BOOKED</h3>" not in html
+
+    client.post(f"/findevents/{event_id}", data={"tickets": 2, "event_id": event_id})
+
+    cache, html = listing(anonymous)
+    assert cache == "MISS" and "<h3>BOOKED</h3>" in html
+
+
+def test_update_invalidates_the_listing(app, client, anonymous, make_event):
+    event_id = make_event(title="Before")
+    assert listing(anonymous)[0] == "MISS"
+    assert listing(anonymous)[0] == "HIT"
+
+    client.post("/myevents/", data=dict(ROW, title="After", event_id=event_id))
+
+    cache, html = listing(anonymous)
+    assert cache == "MISS" and "After" in html and "Before" not in html
+
+
+def test_import_invalidates_the_listing(app, client, anonymous, make_event):
+    make_event(title="Existing")
+    assert listing(anonymous)[0] == "MISS"
+    assert listing(anonymous)[0] == "HIT"
+
+    values = dict(ROW, title="Imported")
+    content = ",".join(EVENT_FIELDS) + "\n" + ",".join(values[f] for f in EVENT_FIELDS)
+    upload(client, content.encode(), "events.csv")
+
+    cache, html = listing(anonymous)
+    assert cache == "MISS" and "Imported" in html
+
+
+def test_delete_invalidates_the_listing(app, client, anonymous, make_event):
+    from concerts.purge import purging
+
+    event_id = make_event(title="Deleted")
+    assert listing(anonymous)[0] == "MISS"
+    assert listing(anonymous)[0] == "HIT"
+
+    client.get(f"/myevents/delete/{event_id}")
+    with purging:
+        pass
+
+    cache, html = listing(anonymous)
+    assert cache == "MISS" and "Deleted" not in html
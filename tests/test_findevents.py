@@ -0,0 +1,27 @@
+from datetime import datetime
+
+from concerts.models import Booking, Event
+
+
+def test_anonymous_booking_asks_to_log_in(app, make_event):
+    event_id = make_event()
+
+    response = app.test_client().post(
+        f"/findevents/{event_id}", data={"tickets": 2, "event_id": event_id}
+    )
+
+    assert response.status_code == 302
+    assert "/account" in response.headers["Location"]
+    with app.app_context():
+        assert Event.query.get(event_id).tickets == 10
+        assert Booking.query.count() == 0
+
+
+def test_comments_of_missing_and_deleted_events_are_not_found(app, make_event):
+    event_id = make_event()
+    deleted_id = make_event(deleted_at=datetime.now())
+    client = app.test_client()
+
+    assert client.get(f"/findevents/{event_id}/comments").status_code == 200
+    assert client.get(f"/findevents/{deleted_id}/comments").status_code == 404
+    assert client.get(f"/findevents/{deleted_id + 1}/comments").status_code == 404
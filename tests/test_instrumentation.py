@@ -0,0 +1,17 @@
+import logging
+
+
+def test_slow_queries_are_explained_after_the_response(app, client, caplog):
+    threshold = app.config["SLOW_QUERY_SECONDS"]
+    app.config["SLOW_QUERY_SECONDS"] = -1
+    try:
+        with caplog.at_level(logging.WARNING, logger=app.logger.name):
+            response = client.get("/myevents/")
+            response.get_data()
+            explained_before_close = "Slow query" in caplog.text
+            response.close()
+    finally:
+        app.config["SLOW_QUERY_SECONDS"] = threshold
+
+    assert not explained_before_close
+    assert "Slow query in myevents.show" in caplog.text
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+import re
+
+from concerts import db
+from concerts.models import Event
+from concerts.myevents import EVENTS_PER_PAGE
+
+
+def test_show_pages_events(app, organiser, client):
+    with app.app_context():
+        start = datetime(2099, 1, 1)
+        db.session.add_all(
+            Event(
+                title=f"Event {i:02}",
+                artist="Artist",
+                genre="Rock",
+                timestamp=start + timedelta(days=i),
+                venue_name="Venue",
+                venue_address="1 Venue Street",
+                desc="Description",
+                status="upcoming",
+                tickets=10,
+                price=25.0,
+                user_id=organiser,
+            )
+            for i in range(EVENTS_PER_PAGE + 5)
+        )
+        db.session.commit()
+
+    first = client.get("/myevents/").get_data(as_text=True)
+    cursor = re.search(r"cursor=([\w-]+)", first).group(1)
+    second = client.get("/myevents/?cursor=" + cursor).get_data(as_text=True)
+
+    assert "Event 00" in first and f"Event {EVENTS_PER_PAGE - 1}" in first
+    assert f"Event {EVENTS_PER_PAGE}" not in first
+    assert f"Event {EVENTS_PER_PAGE}" in second and "Event 00" not in second
+
+
+def delete(app, client, event_id):
+    from concerts.purge import purging
+
+    response = client.get(f"/myevents/delete/{event_id}")
+    # Wait for the background purge, so it can't overlap the next request
+    with purging:
+        pass
+    return response
+
+
+def test_delete_removes_sales_once(app, organiser, client, make_event):
+    from concerts.booking import book_tickets
+    from concerts.sales import daily_sales
+
+    deleted_id = make_event(title="Deleted")
+    kept_id = make_event(title="Kept")
+    with app.app_context():
+        book_tickets(deleted_id, organiser, 2)
+        book_tickets(kept_id, organiser, 3)
+
+    assert delete(app, client, deleted_id).status_code == 302
+    assert delete(app, client, deleted_id).status_code == 404
+
+    with app.app_context():
+        today = daily_sales(organiser)[-1]
+    assert (today["tickets"], today["bookings"]) == (3, 1)
+
+
+def test_delete_of_another_users_event_is_not_found(app, organiser, make_event):
+    from concerts.models import User
+
+    with app.app_context():
+        other = User(
+            username="other",
+            email="other@example.com",
+            hash="unused",
+            contact_number=400000001,
+            address="2 Test Street",
+        )
+        db.session.add(other)
+        db.session.commit()
+        other_id = other.id
+    event_id = make_event()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(other_id)
+        session["_fresh"] = True
+    try:
+        assert delete(app, client, event_id).status_code == 404
+        with app.app_context():
+            assert Event.query.get(event_id).deleted_at is None
+    finally:
+        with app.app_context():
+            User.query.filter(User.id == other_id).delete()
+            db.session.commit()
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+from concerts.models import Event
+from concerts.pagination import paginate
+
+KEYS = [Event.timestamp, Event.id]
+
+
+def pages(app, cursor=None, direction="next"):
+    """
+    Returns the ids of each page, following cursors in one direction until the end.
+    """
+    result = []
+    with app.app_context():
+        while True:
+            page = paginate(Event.query, KEYS, cursor, per_page=10)
+            result.append([event.id for event in page.items])
+            cursor = page.next_cursor if direction == "next" else page.prev_cursor
+            if cursor is None:
+                return result, page
+
+
+def test_pages_forwards_and_backwards_through_equal_timestamps(app, make_event):
+    # Every event has the same time, so only the id tells them apart
+    timestamp = datetime(2099, 6, 1, 20)
+    ids = [make_event(timestamp=timestamp) for _ in range(25)]
+
+    forwards, last = pages(app)
+    assert forwards == [ids[:10], ids[10:20], ids[20:]]
+    assert last.prev_cursor is not None
+
+    backwards, first = pages(app, last.prev_cursor, "prev")
+    assert backwards == [ids[10:20], ids[:10]]
+    assert first.next_cursor is not None
+
+    with app.app_context():
+        page = paginate(Event.query, KEYS, first.next_cursor, per_page=10)
+    assert [event.id for event in page.items] == ids[10:20]
+
+
+def test_first_page_has_no_previous_page(app, make_event):
+    ids = [make_event() for _ in range(10)]
+
+    with app.app_context():
+        page = paginate(Event.query, KEYS, per_page=10)
+
+    assert [event.id for event in page.items] == ids
+    assert page.prev_cursor is None
+    assert page.next_cursor is None
+
+
+def test_invalid_cursor_is_a_bad_request(app, organiser):
+    response = app.test_client().get("/findevents/?cursor=not-a-cursor")
+
+    assert response.status_code == 400
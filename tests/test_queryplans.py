@@ -0,0 +1,34 @@
+from io import BytesIO
+
+from concerts import db
+from concerts.booking import BOOKED, book_tickets
+from concerts.images import make_images
+from concerts.models import Comment, Event
+
+
+def make_jpeg():
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new("RGB", (64, 48), "red").save(buffer, "JPEG")
+    buffer.seek(0)
+    return buffer
+
+
+def test_check_plans_finds_no_full_scans(app, organiser, make_event):
+    event_id = make_event()
+    with app.app_context():
+        event = Event.query.get(event_id)
+        event.images = make_images(make_jpeg())
+        db.session.add(
+            Comment(
+                desc="Comment", event_id=event_id, user_id=organiser, username="user"
+            )
+        )
+        db.session.commit()
+        assert book_tickets(event_id, organiser, 1) == BOOKED
+
+    result = app.test_cli_runner().invoke(args=["check-plans"])
+
+    assert result.exit_code == 0, result.output
+    assert "0 full scans" in result.output
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+from time import time
+
+import pytest
+
+from concerts import db
+from concerts.booking import BOOKED
+from concerts.models import Event, QueueEntry
+from concerts import waitingroom
+from concerts.waitingroom import INTERRUPTED, PROCESSING, advance, enqueue, process
+
+
+@pytest.fixture
+def event_id(make_event):
+    return make_event(title="Queued")
+
+
+def test_process_books_an_entry(app, organiser, event_id):
+    with app.app_context():
+        entry = enqueue(event_id, organiser, 2)
+
+        assert process(entry) == BOOKED
+        assert Event.query.get(event_id).tickets == 8
+
+
+def test_process_gives_up_on_a_stale_entry(app, organiser, event_id):
+    with app.app_context():
+        entry = enqueue(event_id, organiser, 2)
+        entry.result = PROCESSING
+        entry.claimed = time() - app.config["WAITING_ROOM_CLAIM_TIMEOUT"] - 1
+        db.session.commit()
+
+        assert process(entry) == INTERRUPTED
+        assert Event.query.get(event_id).tickets == 10
+
+
+def test_process_records_a_failed_booking(app, organiser, event_id, monkeypatch):
+    def book_tickets(event_id, user_id, tickets):
+        raise RuntimeError("The worker broke off")
+
+    monkeypatch.setattr(waitingroom, "book_tickets", book_tickets)
+    with app.app_context():
+        entry = enqueue(event_id, organiser, 2)
+
+        with pytest.raises(RuntimeError):
+            process(entry)
+
+        assert QueueEntry.query.get(entry.id).result == INTERRUPTED
+
+
+def test_advance_prunes_old_entries(app, organiser, event_id):
+    with app.app_context():
+        old = enqueue(event_id, organiser, 1)
+        old_id = old.id
+        advance(event_id)
+        process(old)
+        old.timestamp = datetime.now() - timedelta(
+            seconds=app.config["WAITING_ROOM_RETENTION"] + 1
+        )
+        db.session.commit()
+
+        new_id = enqueue(event_id, organiser, 1).id
+        advance(event_id)
+
+        assert QueueEntry.query.get(old_id) is None
+        assert QueueEntry.query.get(new_id) is not None
+
+
+def test_status_of_a_deleted_event_is_gone(app, organiser, client, event_id):
+    from concerts.purge import purge_event, soft_delete_event
+
+    with app.app_context():
+        token = enqueue(event_id, organiser, 1).token
+        soft_delete_event(Event.query.get(event_id))
+    url = f"/findevents/{event_id}/queue/{token}/status"
+
+    response = client.get(url)
+    assert response.status_code == 410
+    assert response.json["redirect"].endswith("/findevents/")
+
+    with app.app_context():
+        purge_event(event_id)
+    assert client.get(url).status_code == 410